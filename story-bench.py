@@ -0,0 +1,253 @@
+"""Benchmark harness for story-gen2.py.
+
+Generates synthetic chat scripts of controlled size and shape, measures
+frames/second for ``render_chat_frame``, ``typing_keyboard`` and
+``typing_indicator``, end-to-end render time and peak RSS, and writes the
+results as sorted JSON so runs from two versions can be diffed or compared
+with ``--compare``.
+
+    python story-bench.py                      # all scenarios -> bench-results.json
+    python story-bench.py --quick              # small subset for a smoke run
+    python story-bench.py --compare old.json   # flag regressions against an earlier run
+"""
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(HERE, "examples", "chat.json")
+
+WORDS = (
+    "ok so I was thinking we could go tonight but honestly the place is kinda far and "
+    "traffic gonna be terrible again lol what about tomorrow instead maybe after work "
+    "seriously literally absolutely unbelievable ridiculous whatever sounds good to me "
+    "did you see that message from earlier no way are you kidding right now"
+).split()
+EMOJI = ["😂", "😭", "🔥", "😎", "🙏", "💀", "🥹", "✨", "👀", "❤️"]
+PEERS = ["Sam", "Jo", "Riley", "Casey", "Morgan", "Jamie", "Quinn", "Avery", "Drew", "Rowan", "Skyler", "Parker"]
+
+# name -> synthetic script shape; "fixture" uses examples/chat.json as-is
+SCENARIOS = {
+    "direct-10": dict(messages=10, words=8, me_ratio=0.5, peers=1, chat_type="direct"),
+    "direct-100": dict(messages=100, words=8, me_ratio=0.5, peers=1, chat_type="direct"),
+    "direct-500": dict(messages=500, words=8, me_ratio=0.5, peers=1, chat_type="direct"),
+    "long-messages-100": dict(messages=100, words=30, me_ratio=0.5, peers=1, chat_type="direct"),
+    "me-heavy-100": dict(messages=100, words=10, me_ratio=0.9, peers=1, chat_type="direct"),
+    "direct-5-peers-100": dict(messages=100, words=8, me_ratio=0.4, peers=5, chat_type="direct"),
+    "group-8-200": dict(messages=200, words=8, me_ratio=0.2, peers=8, chat_type="group"),
+    "emoji-100": dict(messages=100, words=8, me_ratio=0.5, peers=1, chat_type="direct", emoji=0.3),
+    "fixture": None,
+}
+QUICK_SCENARIOS = ["direct-10", "group-8-200", "fixture"]
+
+def synthetic_script(messages, words=8, me_ratio=0.5, peers=1, chat_type="direct", emoji=0.0, seed=0):
+    """A script in the ``load_script`` JSON format with the requested shape.
+
+    ``words`` is the mean words per message, ``me_ratio`` the share of
+    messages sent by "Me" and ``emoji`` the chance of each word being
+    followed by an emoji.
+    """
+    rng = random.Random(seed)
+    others = PEERS[:peers]
+    out = []
+    for _ in range(messages):
+        sender = "Me" if rng.random() < me_ratio else rng.choice(others)
+        count = max(1, int(rng.expovariate(1 / words)))
+        text = []
+        for _ in range(count):
+            text.append(rng.choice(WORDS))
+            if rng.random() < emoji:
+                text.append(rng.choice(EMOJI))
+        out.append({"sender": sender, "text": " ".join(text)})
+    script = {"me": "Me", "type": chat_type, "messages": out}
+    if chat_type == "direct":
+        script["contact"] = others[0]
+    return script
+
+def load_story_module():
+    spec = importlib.util.spec_from_file_location("story_gen2", os.path.join(HERE, "story-gen2.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _sample(items, limit):
+    """Up to ``limit`` items spread evenly over ``items``."""
+    if len(items) <= limit:
+        return list(items)
+    step = len(items) / limit
+    return [items[int(i * step)] for i in range(limit)]
+
+def _fps(frames, seconds):
+    return round(frames / seconds, 2) if seconds else None
+
+def run_scenario(name, options):
+    """Measure one scenario; runs in a fresh process so peak RSS is its own."""
+    sg = load_story_module()
+    sg.BATTERY_LEVEL = 57  # Deterministic chrome
+    if options["resolution"]:
+        sg.configure_layout(sg.Layout.parse(options["resolution"]))
+    quiet = lambda *a, **k: None
+    limit = options["frames"]
+
+    if SCENARIOS[name] is None:
+        with open(FIXTURE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        data = synthetic_script(**SCENARIOS[name], seed=options["seed"])
+    started = time.perf_counter()
+    story = sg.resolve_story(sg.parse_script(data))
+    plan = sg.plan_story(story["dialogue"], story["me"], story["chat_type"], contact=story["contact"],
+                         group_title=story["group_title"], show_names=story["show_names"])
+    plan_seconds = time.perf_counter() - started
+    result = {
+        "messages": len(plan),
+        "chat_type": story["chat_type"],
+        "plan_seconds": round(plan_seconds, 4),
+    }
+
+    # Settled frames at evenly spread points of the story
+    started = time.perf_counter()
+    settled = _sample(plan, limit)
+    for seg in settled:
+        sg.render_chat_frame(seg["history"][:seg["count"] + 1], title=seg["title"])
+    result["render_chat_frame_fps"] = _fps(len(settled), time.perf_counter() - started)
+
+    # Typing animations, every frame rendered (no run-length merging) the way the
+    # timeline renders them, with in-place redraws between consecutive frames
+    for label, side, animate in (
+        ("typing_keyboard", "right",
+         lambda seg: sg.typing_keyboard(seg["text"], title=seg["title"], history=seg["history"][:seg["count"]])),
+        ("typing_indicator", "left",
+         lambda seg: sg.typing_indicator(seg["name"], y_offset=seg["y"], title=seg["title"],
+                                         history=seg["history"][:seg["count"]])),
+    ):
+        frames = 0
+        renderer = sg.FrameRenderer()
+        started = time.perf_counter()
+        for seg in _sample([seg for seg in plan if seg["side"] == side], limit):
+            for spec, _ in animate(seg):
+                renderer.render(spec)
+                frames += 1
+                if frames >= limit:
+                    break
+            if frames >= limit:
+                break
+        result[f"{label}_fps"] = _fps(frames, time.perf_counter() - started)
+
+    if options["video"] and len(plan) <= options["video_max_messages"]:
+        with tempfile.TemporaryDirectory(prefix="story-bench-") as tmp:
+            summary = sg.render_story(story, os.path.join(tmp, "bench.mp4"), fps=options["fps"], log=quiet)
+        result["end_to_end_seconds"] = summary["seconds"]
+        result["video_frames"] = summary["frames"]
+        result["unique_frames"] = summary["unique_frames"]
+        result["video_bytes"] = summary["bytes"]
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_rss_mb"] = round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return result
+
+def environment():
+    import numpy
+    import PIL
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+# Metrics where a larger value is better; everything else is "lower is better"
+HIGHER_IS_BETTER = ("_fps",)
+COMPARED = ("render_chat_frame_fps", "typing_keyboard_fps", "typing_indicator_fps",
+            "end_to_end_seconds", "peak_rss_mb")
+
+def compare(old, new, threshold):
+    """Print per-metric changes against an earlier results file; returns the regression count."""
+    regressions = 0
+    for name, metrics in new["scenarios"].items():
+        before = old.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for key in COMPARED:
+            a, b = before.get(key), metrics.get(key)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+            flag = ""
+            if worse > threshold:
+                flag = "  <-- regression"
+                regressions += 1
+            print(f"  {name:<20} {key:<22} {a:>10} -> {b:<10} {change:+7.1%}{flag}")
+    return regressions
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark story-gen2.py on synthetic scripts")
+    p.add_argument("--scenarios", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    p.add_argument("--quick", action="store_true", help=f"Only run {', '.join(QUICK_SCENARIOS)}")
+    p.add_argument("--frames", type=int, default=60, help="Frames measured per render benchmark (default: 60)")
+    p.add_argument("--fps", type=int, default=24, help="Output FPS for the end-to-end render")
+    p.add_argument("--resolution", help="Render size passed to story-gen2 (default: its own default)")
+    p.add_argument("--no-video", dest="video", action="store_false", help="Skip end-to-end renders")
+    p.add_argument("--video-max-messages", type=int, default=100,
+                   help="Only render end-to-end videos for scenarios up to this many messages (default: 100)")
+    p.add_argument("--seed", type=int, default=0, help="Seed for synthetic scripts")
+    p.add_argument("--output", "-o", default="bench-results.json", help="Results file (default: bench-results.json)")
+    p.add_argument("--compare", metavar="OLD_JSON", help="Compare against an earlier results file")
+    p.add_argument("--threshold", type=float, default=0.10,
+                   help="Relative change counted as a regression with --compare (default: 0.10)")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    names = QUICK_SCENARIOS if args.quick else list(SCENARIOS)
+    if args.scenarios:
+        names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+        unknown = [n for n in names if n not in SCENARIOS]
+        if unknown:
+            raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+    options = {
+        "frames": args.frames,
+        "fps": args.fps,
+        "resolution": args.resolution,
+        "video": args.video,
+        "video_max_messages": args.video_max_messages,
+        "seed": args.seed,
+    }
+
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    for name in names:
+        started = time.perf_counter()
+        with ctx.Pool(1) as pool:
+            results[name] = pool.apply(run_scenario, (name, options))
+        r = results[name]
+        print(f"{name:<20} {r['messages']:>4} msgs  frame {r['render_chat_frame_fps'] or 0:7.1f} fps  "
+              f"keyboard {r['typing_keyboard_fps'] or 0:7.1f} fps  dots {r['typing_indicator_fps'] or 0:7.1f} fps  "
+              f"e2e {r.get('end_to_end_seconds', '-')}s  rss {r['peak_rss_mb']} MB  "
+              f"({time.perf_counter() - started:.1f}s)")
+
+    report = {"environment": environment(), "options": options, "scenarios": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Results saved -> {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        print(f"Compared with {args.compare}:")
+        if compare(old, report, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,3 @@
-from moviepy.editor import ImageClip, concatenate_videoclips
-from PIL import Image, ImageDraw, ImageFont
-import numpy as np
 import random
 import string
 import datetime
@@ -8,9 +5,55 @@ import re
 import os
 import json
 import argparse
+import glob
+import time
+import importlib.util
+import functools
+import bisect
+import itertools
+import sys
+from array import array
+from collections import OrderedDict
+import shutil
+import tempfile
+import threading
+import heapq
+
+def _lazy_import(name):
+    """``name`` as a module that is only executed on first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+# Modules only a render needs load when it first touches them, so --validate and --help stay fast
+Image = _lazy_import('PIL.Image')
+ImageDraw = _lazy_import('PIL.ImageDraw')
+ImageFont = _lazy_import('PIL.ImageFont')
+imageio_ffmpeg = _lazy_import('imageio_ffmpeg')
+np = _lazy_import('numpy')
+multiprocessing = _lazy_import('multiprocessing')
+subprocess = _lazy_import('subprocess')
+hashlib = _lazy_import('hashlib')
+uuid = _lazy_import('uuid')
 
 # Video settings
 WIDTH, HEIGHT = 720, 1280
+# Every pixel measurement is designed at 720x1280; configure_layout() sets the
+# output size and multiplies them all by SCALE
+SCALE = 1
+RESOLUTION_PRESETS = {
+    "540p": (540, 960),
+    "720p": (720, 1280),
+    "1080p": (1080, 1920),
+    "1440p": (1440, 2560),
+}
 # Layout constants (iPhone 15 Pro dimensions and spacing)
 STATUS_BAR_H = 59  # iPhone 15 Pro status bar height
 HEADER_H = 96      # Proper header height for navigation
@@ -35,37 +78,152 @@ KEY_FILL = (84, 84, 88)        # Key background
 KEY_HL = (99, 99, 102)         # Key highlight
 INPUT_BG = (58, 58, 60)        # Input field background
 
-# Typography - iPhone 15 system fonts
-try:
-    # Try SF Pro Display equivalent
-    FONT = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 34)
-    SMALL_FONT = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 28)
-    TIME_FONT = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 32)
-    HEADER_FONT = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 38)
-except Exception:
+def px(v):
+    """Scale a 720x1280 design measurement by ``SCALE`` (identity at full size)."""
+    if SCALE == 1 or not v:
+        return v
+    # Never let a non-zero measurement (line width, gap) collapse to nothing
+    return int(round(v * SCALE)) or (1 if v > 0 else -1)
+
+# Typography - iPhone 15 system fonts, loaded by load_fonts() once a render starts
+FONT = SMALL_FONT = TIME_FONT = HEADER_FONT = None
+# UI font candidates in order of preference, with FONT, SMALL_FONT, TIME_FONT, HEADER_FONT sizes
+FONT_CANDIDATES = [
+    ("/System/Library/Fonts/Helvetica.ttc", (34, 28, 32, 38)),  # SF Pro Display equivalent
+    # Ubuntu fonts but larger for iPhone feel
+    ("/usr/share/fonts/truetype/ubuntu/UbuntuSans[wdth,wght].ttf", (36, 30, 34, 40)),
+]
+
+def discover_font():
+    """``(path, sizes)`` of the first usable ``FONT_CANDIDATES`` entry, or None.
+
+    The choice is remembered in ``FONT_CACHE_FILE`` so later runs skip the probing.
+    """
     try:
-        # Fallback to Ubuntu fonts but larger for iPhone feel
-        FONT = ImageFont.truetype("/usr/share/fonts/truetype/ubuntu/UbuntuSans[wdth,wght].ttf", 36)
-        SMALL_FONT = ImageFont.truetype("/usr/share/fonts/truetype/ubuntu/UbuntuSans[wdth,wght].ttf", 30)
-        TIME_FONT = ImageFont.truetype("/usr/share/fonts/truetype/ubuntu/UbuntuSans[wdth,wght].ttf", 34)
-        HEADER_FONT = ImageFont.truetype("/usr/share/fonts/truetype/ubuntu/UbuntuSans[wdth,wght].ttf", 40)
-    except Exception:
-        FONT = ImageFont.load_default()
-        SMALL_FONT = ImageFont.load_default()
-        TIME_FONT = ImageFont.load_default()
-        HEADER_FONT = ImageFont.load_default()
+        with open(FONT_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if os.path.exists(cached['path']):
+            return cached['path'], tuple(cached['sizes'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    for path, sizes in FONT_CANDIDATES:
+        try:
+            ImageFont.truetype(path, sizes[0])
+        except OSError:
+            continue
+        try:
+            os.makedirs(os.path.dirname(FONT_CACHE_FILE), exist_ok=True)
+            tmp = f"{FONT_CACHE_FILE}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'path': path, 'sizes': sizes}, f)
+            os.replace(tmp, FONT_CACHE_FILE)
+        except OSError:
+            pass  # Read-only cache dir: probe again next run
+        return path, sizes
+    return None
+
+def load_fonts():
+    """Load the UI fonts at their design sizes scaled by ``SCALE``."""
+    global FONT, SMALL_FONT, TIME_FONT, HEADER_FONT
+    found = discover_font()
+    if found is None:
+        FONT = SMALL_FONT = TIME_FONT = HEADER_FONT = ImageFont.load_default()
+        return
+    path, sizes = found
+    FONT, SMALL_FONT, TIME_FONT, HEADER_FONT = (ImageFont.truetype(path, px(size)) for size in sizes)
 
 # Random battery level (generated once per run)
 BATTERY_LEVEL = random.randint(15, 100)
 NETWORK_TYPE = "5G"  # Static network type for realism
+CLOCK_TIME = None  # Status bar time; None shows the wall clock (pinned per story while caching)
+
+PREVIEW_SCALE = 0.5  # --preview renders at this fraction of the full size
+PREVIEW_FPS = 8
+PREVIEW_COLUMNS = 6  # Contact sheet thumbnails per row
+DRY_RUN_SAMPLE_FRAMES = 48  # Unique frames rendered and encoded to calibrate --dry-run's estimate
+
+# Message-font glyphs rasterized (with their kerning pairs) by warm_caches()
+ATLAS_PREWARM_CHARS = string.ascii_letters + string.digits + " .,!?'’\"-:;()@#&/"
+
+# Bump whenever drawing changes so cached segments from older versions are not reused
+RENDERER_VERSION = 4
+CACHE_ROOT = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                          'story-gen')
+SEGMENT_CACHE_DIR = os.environ.get('STORY_CACHE_DIR') or os.path.join(CACHE_ROOT, 'segments')
+FONT_CACHE_FILE = os.path.join(CACHE_ROOT, 'fonts.json')
+SEGMENT_CACHE_MB = 2048  # Default size bound for --cache-size
 
 ME_NAME = "Alex"  # default; can be overridden by CLI or script file
 DEFAULT_SCRIPT = "examples/chat.json"
-dialogue = []  # loaded from JSON script
 
 def load_script(path):
+    """Load a script file; returns ``(me, title, dialogue, chat_type, contact)``.
+
+    ``.jsonl`` scripts are streamed (see ``ScriptStream``); anything else is
+    parsed as one JSON document.
+    """
+    if path.endswith('.jsonl'):
+        stream = ScriptStream(path)
+        header = stream.header
+        return (header.get('me'), header.get('title'), stream,
+                header.get('type') or header.get('chat_type'), header.get('contact') or header.get('other'))
     with open(path, 'r', encoding='utf-8') as f:
         data = json.load(f)
+    return parse_script(data)
+
+def _normalize_message(m):
+    """``(sender, text)`` for one script message (an object or a 2-item array)."""
+    if isinstance(m, dict):
+        sender = m.get('sender') or m.get('name')
+        text = m.get('text')
+    elif isinstance(m, (list, tuple)) and len(m) >= 2:
+        sender, text = m[0], m[1]
+    else:
+        raise ValueError('Each message must be an object with sender/text or a 2-item array')
+    if not isinstance(sender, str) or not isinstance(text, str):
+        raise ValueError('sender and text must be strings')
+    return sender, text
+
+class ScriptStream:
+    """Messages of a ``.jsonl`` script, read from disk on every pass.
+
+    One message per line (``{"sender": ..., "text": ...}`` or a 2-item
+    array); an optional first line without a sender holds the script's
+    settings (``me``, ``title``, ``type``, ``contact``). Iterating yields
+    ``(sender, text)`` pairs without keeping the parsed lines, so very long
+    conversations are held only as the planner's compact history.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = {}
+        self._len = None
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    first = json.loads(line)
+                    if isinstance(first, dict) and not (first.get('sender') or first.get('name')):
+                        self.header = first
+                    break
+
+    def __iter__(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = (line for line in f if line.strip())
+            if self.header:
+                next(lines, None)
+            for lineno, line in enumerate(lines, 1):
+                try:
+                    yield _normalize_message(json.loads(line))
+                except ValueError as e:
+                    raise ValueError(f"{self.path}: message {lineno}: {e}") from None
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(1 for _ in self)
+        return self._len
+
+def parse_script(data):
+    """Normalize already-parsed script JSON; returns the same tuple as ``load_script``."""
     # Accept either {"messages": [{"sender":, "text":}, ...], "me": "...", "title": "..."}
     # or a bare list of {sender,text}
     if isinstance(data, dict):
@@ -85,18 +243,7 @@ def load_script(path):
     else:
         raise ValueError('Unsupported script format')
     # Normalize to list of tuples
-    normalized = []
-    for m in messages:
-        if isinstance(m, dict):
-            sender = m.get('sender') or m.get('name')
-            text = m.get('text')
-        elif isinstance(m, (list, tuple)) and len(m) >= 2:
-            sender, text = m[0], m[1]
-        else:
-            raise ValueError('Each message must be an object with sender/text or a 2-item array')
-        if not isinstance(sender, str) or not isinstance(text, str):
-            raise ValueError('sender and text must be strings')
-        normalized.append((sender, text))
+    normalized = [_normalize_message(m) for m in messages]
     return me, title, normalized, chat_type, contact
 
 def parse_args():
@@ -108,52 +255,105 @@ def parse_args():
     p.add_argument('--contact', help='Direct chat contact name (for type=direct)')
     p.add_argument('--output', '-o', default='imessage_story.mp4', help='Output video filename')
     p.add_argument('--fps', type=int, default=24, help='Output FPS')
+    p.add_argument('--workers', type=int, default=1,
+                   help='Render message segments in N worker processes and join them without re-encoding')
+    p.add_argument('--vfr', action='store_true',
+                   help='Variable frame rate output: encode each unique frame once with its duration '
+                        '(ffmpeg concat demuxer); usually a smaller file. Same as --encoder vfr')
+    p.add_argument('--encoder', choices=list(WRITER_BACKENDS), default='pipe',
+                   help='Output backend: pipe (raw frames streamed to ffmpeg), vfr, moviepy, '
+                        'or png (numbered frames in a directory named after --output)')
+    p.add_argument('--encoder-profile', choices=list(ENCODER_PROFILES), default=DEFAULT_ENCODER_PROFILE,
+                   help=f'Encoder settings: draft (fastest), social (smaller upload-ready file), '
+                        f'archive (lossless), webm (VP9; use a .webm output) (default: {DEFAULT_ENCODER_PROFILE})')
+    p.add_argument('--batch', metavar='PATH',
+                   help='Render many scripts in one process: a directory of .json scripts, a glob, '
+                        'or a .jsonl manifest of jobs ({"script": ..., "output": ..., "me": ...})')
+    p.add_argument('--jobs', type=int, default=1, help='Batch mode: stories rendered at once')
+    p.add_argument('--output-dir', default='renders', help='Batch mode: directory for rendered videos')
+    p.add_argument('--summary', help='Batch mode: per-job JSONL summary (default: <output-dir>/batch_summary.jsonl)')
+    p.add_argument('--preview', nargs='?', const='sheet', choices=['sheet', 'draft'],
+                   help='Fast low-resolution preview instead of the full render: "sheet" (default) saves a '
+                        'contact sheet of every message\'s settled frame, "draft" a low-fps draft video')
+    p.add_argument('--preview-scale', type=float, default=PREVIEW_SCALE,
+                   help=f'Preview size as a fraction of --resolution (default: {PREVIEW_SCALE})')
+    p.add_argument('--resolution', default=f'{WIDTH}x{HEIGHT}',
+                   help=f'Output size as WIDTHxHEIGHT or a preset ({", ".join(RESOLUTION_PRESETS)}); '
+                        f'fonts and layout scale with it (default: {WIDTH}x{HEIGHT})')
+    p.add_argument('--profile', nargs='?', const='', metavar='JSON',
+                   help='Report wall time and call counts per stage (layout, bubbles, input bar, keyboard, chrome, '
+                        'conversion, encoding), overall and per message, and save them as JSON '
+                        '(default: <output>.profile.json)')
+    p.add_argument('--scroll-buffer', action='store_true',
+                   help='Keep each chat on one tall pre-rendered canvas and crop frames from it '
+                        '(constant per-frame cost; memory grows with chat length)')
+    p.add_argument('--serve', nargs='?', const=DAEMON_PORT, type=int, metavar='PORT',
+                   help=f'Run as a render daemon: accept jobs over a localhost HTTP API and render them in '
+                        f'--jobs warm worker processes, writing into --output-dir (default port: {DAEMON_PORT})')
+    p.add_argument('--host', default='127.0.0.1', help='Daemon mode: address to listen on (default: 127.0.0.1)')
+    p.add_argument('--dry-run', action='store_true',
+                   help='Compile the timeline without rendering: print every message\'s events, the video '
+                        'length, frame counts and an estimated render time for the other options given')
+    p.add_argument('--validate', action='store_true',
+                   help='Check --script (with --me/--type/--contact/--title) and exit without rendering')
+    p.add_argument('--cache', action='store_true',
+                   help='Encode each message as its own cached segment and reuse unchanged ones on reruns. '
+                        'Every message then starts a new keyframe group, so files are typically 15-35%% larger')
+    p.add_argument('--no-cache', dest='cache', action='store_false', help='Render without the segment cache (default)')
+    p.add_argument('--cache-dir', default=SEGMENT_CACHE_DIR,
+                   help=f'Segment cache directory (default: $STORY_CACHE_DIR or {SEGMENT_CACHE_DIR})')
+    p.add_argument('--cache-size', type=float, default=SEGMENT_CACHE_MB, metavar='MB',
+                   help=f'Segment cache size bound; least recently used segments are evicted '
+                        f'(default: {SEGMENT_CACHE_MB})')
     return p.parse_args()
 
-def draw_status_bar(draw):
+def current_time_str():
+    if CLOCK_TIME:
+        return CLOCK_TIME
+    now = datetime.datetime.now()
+    try:
+        return now.strftime("%-I:%M")
+    except Exception:
+        return now.strftime("%I:%M").lstrip("0")
+
+def draw_status_bar(draw, time_str=None):
     """iPhone 15 Pro status bar with pixel-perfect iOS accuracy."""
-    def current_time_str():
-        now = datetime.datetime.now()
-        try:
-            return now.strftime("%-I:%M")
-        except Exception:
-            return now.strftime("%I:%M").lstrip("0")
-    time_str = current_time_str()
+    time_str = time_str or current_time_str()
 
     # Time on left
-    draw.text((24, 16), time_str, font=TIME_FONT, fill=WHITE)
+    draw_text(draw, (px(24), px(16)), time_str, TIME_FONT, WHITE)
 
     # Dynamic Island (more accurate)
-    island_width = 108
-    island_height = 34
+    island_width = px(108)
+    island_height = px(34)
     island_x = (WIDTH - island_width) // 2
-    island_y = 12
+    island_y = px(12)
     draw.rounded_rectangle([island_x, island_y, island_x + island_width, island_y + island_height],
                            island_height // 2, fill=(18, 18, 18))
 
     # --- Status icons on the same baseline ---
-    baseline_y = 22  # Common baseline for all status elements
+    baseline_y = px(22)  # Common baseline for all status elements
 
     # Battery (right-aligned)
-    right_margin = 18
-    battery_width = 26
-    battery_height = 13
+    right_margin = px(18)
+    battery_width = px(26)
+    battery_height = px(13)
     battery_x = WIDTH - right_margin - battery_width
     battery_y = baseline_y - battery_height//2  # Center on baseline
     
     # Battery outline
     draw.rounded_rectangle([battery_x, battery_y, battery_x + battery_width, battery_y + battery_height],
-                           3, fill=None, outline=WHITE, width=1)
-    draw.rectangle([battery_x + battery_width, battery_y + 4, 
-                  battery_x + battery_width + 2, battery_y + battery_height - 4], fill=WHITE)
+                           px(3), fill=None, outline=WHITE, width=px(1))
+    draw.rectangle([battery_x + battery_width, battery_y + px(4), 
+                  battery_x + battery_width + px(2), battery_y + battery_height - px(4)], fill=WHITE)
     
     # Battery fill
-    fill_width = int((battery_width - 4) * (BATTERY_LEVEL / 100))
+    fill_width = int((battery_width - px(4)) * (BATTERY_LEVEL / 100))
     fill_color = (52, 199, 89) if BATTERY_LEVEL > 20 else (255, 59, 48)
     if fill_width > 0:
-        draw.rounded_rectangle([battery_x + 2, battery_y + 2, 
-                              battery_x + 2 + fill_width, battery_y + battery_height - 2],
-                               2, fill=fill_color)
+        draw.rounded_rectangle([battery_x + px(2), battery_y + px(2), 
+                              battery_x + px(2) + fill_width, battery_y + battery_height - px(2)],
+                               px(2), fill=fill_color)
 
     # 5G text - aligned on same baseline
     network_type = "5G"
@@ -161,26 +361,26 @@ def draw_status_bar(draw):
     # Calculate vertical position to align with baseline
     bbox = SMALL_FONT.getbbox(network_type)
     network_height = bbox[3] - bbox[1]
-    network_x = battery_x - 10 - netw_w
-    network_y = baseline_y - network_height + 6  # Adjust to match baseline
-    draw.text((network_x, network_y), network_type, font=SMALL_FONT, fill=WHITE)
+    network_x = battery_x - px(10) - netw_w
+    network_y = baseline_y - network_height + px(6)  # Adjust to match baseline
+    draw_text(draw, (network_x, network_y), network_type, SMALL_FONT, WHITE)
 
     # Signal bars - aligned with 5G text
-    bars_right = network_x - 8
-    bar_width = 3
-    bar_gap = 4
-    bar_max_height = 14  # Maximum height of signal bars
+    bars_right = network_x - px(8)
+    bar_width = px(3)
+    bar_gap = px(4)
+    bar_max_height = px(14)  # Maximum height of signal bars
     
     for i in range(4):  # iPhone 15 has 4 signal bars
-        bar_height = 6 + i * 3 if i < 3 else 14  # Last bar is tallest
+        bar_height = px(6 + i * 3) if i < 3 else bar_max_height  # Last bar is tallest
         bar_x = bars_right - (4 - i) * (bar_width + bar_gap)
         # Align bottoms of bars with baseline
-        bar_y = baseline_y - bar_height + 7  # Adjustment to align with baseline
+        bar_y = baseline_y - bar_height + px(7)  # Adjustment to align with baseline
         fill_color = WHITE if i < 3 else (152, 152, 157)  # Last bar dimmed
         draw.rectangle([bar_x, bar_y, bar_x + bar_width, bar_y + bar_height], fill=fill_color)
-        draw.rounded_rectangle([bar_x, bar_y, bar_x + bar_width, bar_y + 2], 1, fill=fill_color)
+        draw.rounded_rectangle([bar_x, bar_y, bar_x + bar_width, bar_y + px(2)], px(1), fill=fill_color)
 
-def draw_header(draw, title="Messages"):
+def draw_header(img, draw, title="Messages"):
     """iPhone 15 Messages app header with realistic design."""
     y0 = STATUS_BAR_H
     
@@ -188,15 +388,15 @@ def draw_header(draw, title="Messages"):
     draw.rectangle([0, y0, WIDTH, y0 + HEADER_H], fill=NAV_BG)
     
     # Back button
-    back_x = 16
+    back_x = px(16)
     back_y = y0 + HEADER_H/2
-    draw.line([(back_x + 10, back_y - 9), (back_x + 2, back_y)], fill=BLUE, width=2)
-    draw.line([(back_x + 2, back_y), (back_x + 10, back_y + 9)], fill=BLUE, width=2)
+    draw.line([(back_x + px(10), back_y - px(9)), (back_x + px(2), back_y)], fill=BLUE, width=px(2))
+    draw.line([(back_x + px(2), back_y), (back_x + px(10), back_y + px(9))], fill=BLUE, width=px(2))
     
     # Avatar with perfectly centered initials
-    avatar_size = 40
+    avatar_size = px(40)
     avatar_x = (WIDTH - avatar_size) // 2
-    avatar_y = y0 + 14
+    avatar_y = y0 + px(14)
     avatar_color = (72, 72, 74)
     
     # Draw avatar circle
@@ -208,7 +408,7 @@ def draw_header(draw, title="Messages"):
         initials = "?"
     
     # Precisely position the text in the center of the circle
-    initials_width = draw.textlength(initials, font=FONT)
+    initials_width = text_length(initials, FONT)
     
     # Use proper text bbox calculation for vertical centering
     bbox = FONT.getbbox(initials)
@@ -218,75 +418,541 @@ def draw_header(draw, title="Messages"):
     # Center horizontally and vertically (accounting for font metrics)
     initials_x = avatar_x + (avatar_size - initials_width) // 2
     # The -2 adjustment fine-tunes vertical alignment based on how SF Pro renders
-    initials_y = avatar_y + (avatar_size - initials_height) // 2 - text_ascent - 2
+    initials_y = avatar_y + (avatar_size - initials_height) // 2 - text_ascent - px(2)
     
-    draw.text((initials_x, initials_y), initials, font=FONT, fill=WHITE)
+    draw_text(draw, (initials_x, initials_y), initials, FONT, WHITE, image=img)
     
     # Contact name below avatar
-    title_width = draw.textlength(title, font=SMALL_FONT)
+    title_width = text_length(title, SMALL_FONT)
     title_x = (WIDTH - title_width) // 2
-    draw.text((title_x, avatar_y + avatar_size + 8), title, font=SMALL_FONT, fill=WHITE)
+    draw_text(draw, (title_x, avatar_y + avatar_size + px(8)), title, SMALL_FONT, WHITE, image=img)
     
     # Call and Video icons (right side) - accurate iOS style
-    video_x = WIDTH - 52
-    video_y = y0 + HEADER_H/2 - 16
-    draw.rounded_rectangle([video_x, video_y, video_x + 28, video_y + 32], 8, fill=BLUE)
-    draw.ellipse([video_x + 10, video_y + 8, video_x + 18, video_y + 16], fill=NAV_BG)
-    draw.ellipse([video_x + 20, video_y + 8, video_x + 22, video_y + 10], fill=(52, 199, 89))
-    phone_x = WIDTH - 104
-    phone_y = y0 + HEADER_H/2 - 16
-    draw.ellipse([phone_x, phone_y, phone_x + 32, phone_y + 32], fill=BLUE)
-    ph_x, ph_y = phone_x + 16, phone_y + 16
-    draw.rounded_rectangle([ph_x - 5, ph_y - 10, ph_x + 5, ph_y - 6], 2, fill=NAV_BG)
-    draw.line([ph_x, ph_y - 6, ph_x, ph_y + 4], fill=NAV_BG, width=3)
-    draw.rounded_rectangle([ph_x - 5, ph_y + 4, ph_x + 5, ph_y + 8], 2, fill=NAV_BG)
-    draw.line([0, y0 + HEADER_H - 1, WIDTH, y0 + HEADER_H - 1], fill=SEPARATOR, width=1)
-
-def compute_group_title(participants):
-    others = [p for p in participants if p != ME_NAME]
+    video_x = WIDTH - px(52)
+    video_y = y0 + HEADER_H/2 - px(16)
+    draw.rounded_rectangle([video_x, video_y, video_x + px(28), video_y + px(32)], px(8), fill=BLUE)
+    draw.ellipse([video_x + px(10), video_y + px(8), video_x + px(18), video_y + px(16)], fill=NAV_BG)
+    draw.ellipse([video_x + px(20), video_y + px(8), video_x + px(22), video_y + px(10)], fill=(52, 199, 89))
+    phone_x = WIDTH - px(104)
+    phone_y = y0 + HEADER_H/2 - px(16)
+    draw.ellipse([phone_x, phone_y, phone_x + px(32), phone_y + px(32)], fill=BLUE)
+    ph_x, ph_y = phone_x + px(16), phone_y + px(16)
+    draw.rounded_rectangle([ph_x - px(5), ph_y - px(10), ph_x + px(5), ph_y - px(6)], px(2), fill=NAV_BG)
+    draw.line([ph_x, ph_y - px(6), ph_x, ph_y + px(4)], fill=NAV_BG, width=px(3))
+    draw.rounded_rectangle([ph_x - px(5), ph_y + px(4), ph_x + px(5), ph_y + px(8)], px(2), fill=NAV_BG)
+    draw.line([0, y0 + HEADER_H - 1, WIDTH, y0 + HEADER_H - 1], fill=SEPARATOR, width=px(1))
+
+def compute_group_title(participants, me=None):
+    me = me or ME_NAME
+    others = [p for p in participants if p != me]
     if not others:
-        return ME_NAME
+        return me
     title = ", ".join(others[:3])
     if len(others) > 3:
         title += f" +{len(others)-3}"
     return title
 
-_EMOJI_REGEX = re.compile(r"[\U0001F000-\U0001FAFF\U00002700-\U000027BF\U0001F900-\U0001F9FF]")
+_EMOJI_REGEX = re.compile(r"[\U0001F000-\U0001FAFF\U00002700-\U000027BF\U0001F900-\U0001F9FF\u2600-\u26FF\u2B50\u2B55]")
+# One emoji as drawn: a flag pair, or a base emoji with its variation selector,
+# skin tone and any ZWJ-joined parts
+_EMOJI_PART = _EMOJI_REGEX.pattern + r"\uFE0F?[\U0001F3FB-\U0001F3FF]?"
+_EMOJI_CLUSTER = re.compile(rf"[\U0001F1E6-\U0001F1FF]{{2}}|{_EMOJI_PART}(?:\u200D{_EMOJI_PART})*")
 
-def wrap_text(draw, text, max_width):
-    lines = []
-    words = text.split(" ")
-    line = ""
-    for w in words:
-        test = (line + " " + w).strip()
-        if draw.textlength(test, font=FONT) <= max_width:
-            line = test
+# Colour emoji fonts tried after $EMOJI_FONT_PATH (see load_emoji_source)
+EMOJI_FONT_PATHS = [
+    "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",
+    "/usr/share/fonts/noto/NotoColorEmoji.ttf",
+    "/System/Library/Fonts/Apple Color Emoji.ttc",
+    "C:\\Windows\\Fonts\\seguiemj.ttf",
+]
+# Bitmap strike sizes of common colour fonts (Noto: 109, Apple: 160/96/64...)
+EMOJI_FONT_SIZES = (109, 160, 137, 96, 64, 48)
+# Rasterized sprites are kept here across runs; set STORY_EMOJI_CACHE_DIR="" to keep them in memory only
+EMOJI_CACHE_DIR = os.environ.get('STORY_EMOJI_CACHE_DIR', os.path.join(CACHE_ROOT, 'emoji'))
+
+class EmojiFontSource:
+    """Colour emoji rasterized from a local colour font at its native bitmap size."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = f"font-{os.path.basename(path)}"
+        self.font = None
+        for size in EMOJI_FONT_SIZES:
+            try:
+                self.font = ImageFont.truetype(path, size)
+                break
+            except OSError:
+                continue
+        if self.font is None:
+            raise OSError(f"No usable bitmap size in {path}")
+
+    def image(self, emoji):
+        """RGBA image of ``emoji`` cropped to its ink, or None if the font has nothing for it."""
+        size = self.font.size
+        canvas = Image.new("RGBA", (size * 2 * len(emoji), size * 2), (0, 0, 0, 0))
+        ImageDraw.Draw(canvas).text((0, 0), emoji, font=self.font, embedded_color=True)
+        bbox = canvas.getbbox()
+        return canvas.crop(bbox) if bbox else None
+
+def load_emoji_source():
+    """First available local colour emoji font: $EMOJI_FONT_PATH, then a system font; else None."""
+    for path in [os.environ.get('EMOJI_FONT_PATH')] + EMOJI_FONT_PATHS:
+        if path and os.path.exists(path):
+            try:
+                return EmojiFontSource(path)
+            except OSError:
+                pass
+    return None
+
+class EmojiSprites:
+    """Colour emoji sprites per ``(emoji, height)``, rasterized once from ``source``.
+
+    Sprites are kept in memory and, with ``cache_dir``, as PNGs on disk so
+    later runs and other processes skip the source entirely.
+    """
+
+    def __init__(self, source, cache_dir=None):
+        self.source = source
+        self.cache_dir = os.path.join(cache_dir, source.name) if cache_dir else None
+        self._sprites = {}
+        self._images = {}  # emoji -> full-size source image (or None)
+
+    def _path(self, emoji, height):
+        name = "-".join(f"{ord(c):x}" for c in emoji)
+        return os.path.join(self.cache_dir, str(height), f"{name}.png")
+
+    def sprite(self, emoji, height):
+        """RGBA sprite of ``emoji`` scaled to ``height`` pixels, or None if the source lacks it."""
+        key = (emoji, height)
+        if key in self._sprites:
+            return self._sprites[key]
+        sprite = None
+        path = self._path(emoji, height) if self.cache_dir else None
+        if path and os.path.exists(path):
+            with Image.open(path) as cached:
+                sprite = cached.convert("RGBA")
+        else:
+            if emoji not in self._images:
+                try:
+                    self._images[emoji] = self.source.image(emoji)
+                except Exception:
+                    self._images[emoji] = None
+            image = self._images[emoji]
+            if image is not None:
+                width = max(1, round(image.width * height / image.height))
+                sprite = image.resize((width, height), Image.LANCZOS)
+                if path:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    sprite.save(tmp, format="PNG")
+                    os.replace(tmp, path)
+        self._sprites[key] = sprite
+        return sprite
+
+_EMOJI_SPRITES = []  # [EmojiSprites or None] once the source has been looked up
+
+def emoji_sprites():
+    """The shared ``EmojiSprites``, or None without a colour emoji source (emoji then draw as text)."""
+    if not _EMOJI_SPRITES:
+        source = load_emoji_source()
+        _EMOJI_SPRITES.append(EmojiSprites(source, EMOJI_CACHE_DIR or None) if source else None)
+    return _EMOJI_SPRITES[0]
+
+def emoji_height(font):
+    return round(font.size * 1.1)
+
+def _emoji_runs(text, font, sprites):
+    """Split ``text`` into ``(run, sprite)`` pieces; ``sprite`` is None for plain text runs."""
+    runs = []
+    start = 0
+    for match in _EMOJI_CLUSTER.finditer(text):
+        sprite = sprites.sprite(match.group(), emoji_height(font))
+        if sprite is None:
+            continue  # Drawn as text
+        if match.start() > start:
+            runs.append((text[start:match.start()], None))
+        runs.append((match.group(), sprite))
+        start = match.end()
+    if start < len(text):
+        runs.append((text[start:], None))
+    return runs
+
+def _sprite_advance(sprite, font):
+    return sprite.width + max(1, font.size // 12)
+
+def text_length(text, font):
+    """Advance width of ``text`` in ``font``, with emoji measured as their sprites."""
+    sprites = emoji_sprites() if _EMOJI_REGEX.search(text) else None
+    if sprites is None:
+        return font.getlength(text)
+    return sum(_sprite_advance(sprite, font) if sprite else font.getlength(run)
+               for run, sprite in _emoji_runs(text, font, sprites))
+
+class TextMeasure:
+    """Bounded LRU cache for text widths and finished line breaks.
+
+    Widths are cached per ``(font, text)`` and wrapped lines per
+    ``(font, text, max_width, hard_wrap)``. Line breaking adds cached word
+    widths instead of re-measuring every growing prefix, so wrapping costs one
+    measurement per distinct word rather than one per word per candidate line.
+    """
+
+    def __init__(self, maxsize=8192):
+        self.maxsize = maxsize
+        self._widths = OrderedDict()
+        self._wraps = OrderedDict()
+        self.width_hits = self.width_misses = 0
+        self.wrap_hits = self.wrap_misses = 0
+
+    def _store(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return value
+
+    def width(self, text, font=None):
+        font = font or FONT
+        key = (font, text)
+        w = self._widths.get(key)
+        if w is not None:
+            self.width_hits += 1
+            self._widths.move_to_end(key)
+            return w
+        self.width_misses += 1
+        return self._store(self._widths, key, text_length(text, font))
+
+    def wrap(self, text, max_width, font=None, hard_wrap=False):
+        """Greedy word-wrap ``text`` to ``max_width``; returns a tuple of lines.
+
+        With ``hard_wrap`` a single word wider than ``max_width`` is split
+        across lines instead of overflowing.
+        """
+        font = font or FONT
+        key = (font, text, max_width, hard_wrap)
+        lines = self._wraps.get(key)
+        if lines is not None:
+            self.wrap_hits += 1
+            self._wraps.move_to_end(key)
+            return lines
+        self.wrap_misses += 1
+        lines = []
+        line, line_w = "", 0.0
+        for word in text.split(" "):
+            line, line_w = self.place_word(lines, line, line_w, word, max_width, font, hard_wrap)
+        if line:
+            lines.append(line)
+        return self._store(self._wraps, key, tuple(lines))
+
+    def place_word(self, lines, line, line_w, word, max_width, font=None, hard_wrap=False):
+        """Add ``word`` to the open ``line`` (of width ``line_w``), spilling into ``lines``.
+
+        Returns the new open line and its width. Empty words (repeated spaces)
+        are skipped.
+        """
+        if not word:
+            return line, line_w
+        font = font or FONT
+        word_w = self.width(word, font)
+        test_w = line_w + self.width(" ", font) + word_w if line else word_w
+        if test_w <= max_width:
+            return (f"{line} {word}" if line else word), test_w
+        if line:
+            lines.append(line)
+        if hard_wrap and word_w > max_width:
+            word = self._split_long_word(lines, word, max_width, font)
+            word_w = self.width(word, font)
+        return word, word_w
+
+    def _split_long_word(self, lines, word, max_width, font):
+        """Hard-wrap ``word`` into full-width chunks; returns the last partial chunk."""
+        while self.width(word, font) > max_width:
+            # Longest prefix that fits, found by bisecting on measured prefixes
+            lo, hi = 1, len(word) - 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if self.width(word[:mid], font) <= max_width:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            lines.append(word[:lo])
+            word = word[lo:]
+        return word
+
+    def clear(self):
+        """Forget every cached width and wrap (e.g. after the fonts change)."""
+        self.__init__(self.maxsize)
+
+    def stats(self):
+        return {
+            "width_hits": self.width_hits,
+            "width_misses": self.width_misses,
+            "wrap_hits": self.wrap_hits,
+            "wrap_misses": self.wrap_misses,
+            "widths_cached": len(self._widths),
+            "wraps_cached": len(self._wraps),
+        }
+
+TEXT_MEASURE = TextMeasure()
+
+# Pillow release series whose private helpers (``Image.Image()._new`` for glyph
+# masks, ``Image._getencoder`` for raw frames) the fast paths were checked
+# against. Other versions take the public fallbacks, which are slower only.
+PILLOW_PRIVATE_API_VERSIONS = ('10.',)
+
+@functools.lru_cache(maxsize=None)
+def pillow_private_api():
+    """Whether the installed Pillow is one the private-API fast paths are known to work with."""
+    return Image.__version__.startswith(PILLOW_PRIVATE_API_VERSIONS)
+
+class GlyphAtlas:
+    """Rasterized glyph masks of one font, with advances and kerning, cached on first use.
+
+    A line of text is assembled from the cached masks with NumPy at the pen
+    positions FreeType's basic layout uses (26.6 fixed-point advances plus
+    pair kerning) and blended the way Pillow blends overlapping glyphs. That
+    gives the exact coverage ``draw.text`` would draw, while FreeType renders
+    each glyph only once.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.glyphs = {}  # char -> (mask array or None, (dx, dy), advance in 1/64 px)
+        self.kerning = {}  # (left, right) -> adjustment in 1/64 px
+
+    def glyph(self, ch):
+        entry = self.glyphs.get(ch)
+        if entry is None:
+            mask, offset = self.font.getmask2(ch, mode='L')
+            if not (mask.size[0] and mask.size[1]):
+                pixels = None
+            elif pillow_private_api():
+                # uint16 so coverage can be blended without overflow
+                pixels = np.asarray(Image.Image()._new(mask), dtype=np.uint16)
+            else:
+                # Public route: draw.text pastes the same mask at the same offset
+                canvas = Image.new('L', mask.size)
+                ImageDraw.Draw(canvas).text((-offset[0], -offset[1]), ch, fill=255, font=self.font)
+                pixels = np.asarray(canvas, dtype=np.uint16)
+            entry = self.glyphs[ch] = (pixels, offset, round(self.font.getlength(ch) * 64))
+        return entry
+
+    def kern(self, left, right):
+        adjust = self.kerning.get((left, right))
+        if adjust is None:
+            font = self.font
+            adjust = round((font.getlength(left + right) - font.getlength(left) - font.getlength(right)) * 64)
+            self.kerning[left, right] = adjust
+        return adjust
+
+    def prewarm(self, chars, kerning=True):
+        """Rasterize ``chars`` (and their pairwise kerning) up front, e.g. before forking workers."""
+        for left in chars:
+            self.glyph(left)
+            if kerning:
+                for right in chars:
+                    self.kern(left, right)
+
+    def mask(self, text):
+        """``(mask, (dx, dy))`` for one line, as ``font.getmask2``; None when nothing is visible."""
+        placed = []
+        pen, prev = 0, None
+        for ch in text:
+            if prev is not None:
+                pen += self.kern(prev, ch)
+            pixels, (dx, dy), advance = self.glyph(ch)
+            if pixels is not None:
+                placed.append((((pen + 32) >> 6) + dx, dy, pixels))
+            pen += advance
+            prev = ch
+        if not placed:
+            return None
+        x0 = min(x for x, _, _ in placed)
+        y0 = min(y for _, y, _ in placed)
+        x1 = max(x + pixels.shape[1] for x, _, pixels in placed)
+        y1 = max(y + pixels.shape[0] for _, y, pixels in placed)
+        out = np.zeros((y1 - y0, x1 - x0), dtype=np.uint16)
+        for x, y, pixels in placed:
+            # Overlapping glyphs blend like Pillow's renderer: dst + src * (255 - dst) / 255, rounded
+            region = out[y - y0:y - y0 + pixels.shape[0], x - x0:x - x0 + pixels.shape[1]]
+            blend = pixels * (255 - region) + 128
+            region += ((blend >> 8) + blend) >> 8
+        return out.astype(np.uint8), (x0, y0)
+
+_GLYPH_ATLASES = {}  # font -> GlyphAtlas
+
+def glyph_atlas(font):
+    atlas = _GLYPH_ATLASES.get(font)
+    if atlas is None:
+        atlas = _GLYPH_ATLASES[font] = GlyphAtlas(font)
+    return atlas
+
+def _draw_glyphs(draw, xy, text, font, fill):
+    """``draw.text`` for a single line, composited from the font's ``GlyphAtlas``."""
+    x, y = xy
+    if ('\n' in text or x != int(x) or y != int(y) or draw.fontmode != 'L'
+            or not isinstance(font, ImageFont.FreeTypeFont) or font.layout_engine != ImageFont.Layout.BASIC):
+        # Multi-line, subpixel, bitmap-font or shaped (raqm) text goes through Pillow's own layout
+        draw.text(xy, text, font=font, fill=fill)
+        return
+    rendered = glyph_atlas(font).mask(text)
+    if rendered is not None:
+        pixels, (dx, dy) = rendered
+        draw.bitmap((int(x) + dx, int(y) + dy), Image.fromarray(pixels), fill=fill)
+
+def draw_text(draw, xy, text, font, fill, image=None):
+    """Draw one line of text, with emoji as colour sprites when an emoji source is available.
+
+    Sprites are pasted onto ``image``, the image ``draw`` paints on; without
+    it emoji are drawn as plain glyphs.
+    """
+    sprites = emoji_sprites() if image is not None and _EMOJI_REGEX.search(text) else None
+    if sprites is None:
+        _draw_glyphs(draw, xy, text, font, fill)
+        return
+    x, y = xy
+    ascent, descent = font.getmetrics()
+    top = int(y) + (ascent + descent - emoji_height(font)) // 2
+    for run, sprite in _emoji_runs(text, font, sprites):
+        if sprite is None:
+            _draw_glyphs(draw, (round(x), y), run, font, fill)
+            x += font.getlength(run)
         else:
-            if line:
-                lines.append(line)
-            line = w
-    if line:
-        lines.append(line)
-    return lines
+            if image.mode == "RGBA":
+                # A masked paste would also blend the tile's alpha, leaving a dark fringe
+                image.alpha_composite(sprite, (round(x), top))
+            else:
+                image.paste(sprite, (round(x), top), sprite)
+            x += _sprite_advance(sprite, font)
+
+class _Stage:
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add(self.name, time.perf_counter() - self.started)
+        return False
+
+class _NullStage:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def _accumulate(table, name, seconds, calls):
+    entry = table.setdefault(name, [0.0, 0])
+    entry[0] += seconds
+    entry[1] += calls
+
+class StageProfiler:
+    """Wall time and call counts per named stage, overall and per message (``--profile``).
+
+    Use ``with PROFILER.stage(name):`` around a block, or ``begin()`` and then
+    ``lap(name)`` to split one function into consecutive stages. Both are
+    no-ops while the profiler is disabled. Times recorded while ``current``
+    holds a message index are also added to that message's breakdown.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.totals = {}    # stage -> [seconds, calls]
+        self.messages = {}  # message index -> {stage -> [seconds, calls]}
+        self.labels = {}    # message index -> sender name
+        self.current = None
+        self._mark = 0.0
+
+    def stage(self, name):
+        return _Stage(self, name) if self.enabled else _NULL_STAGE
+
+    def begin(self):
+        if self.enabled:
+            self._mark = time.perf_counter()
+
+    def lap(self, name):
+        """Record the time since ``begin`` or the previous ``lap`` as ``name``."""
+        if self.enabled:
+            now = time.perf_counter()
+            self.add(name, now - self._mark)
+            self._mark = now
+
+    def add(self, name, seconds, calls=1):
+        _accumulate(self.totals, name, seconds, calls)
+        if self.current is not None:
+            _accumulate(self.messages.setdefault(self.current, {}), name, seconds, calls)
+
+    def snapshot(self):
+        """Picklable copy of the recorded times (to send back from a worker)."""
+        return {"totals": self.totals, "messages": self.messages}
+
+    def merge(self, snapshot):
+        for name, (seconds, calls) in snapshot["totals"].items():
+            _accumulate(self.totals, name, seconds, calls)
+        for index, stages in snapshot["messages"].items():
+            for name, (seconds, calls) in stages.items():
+                _accumulate(self.messages.setdefault(index, {}), name, seconds, calls)
+
+    def report(self):
+        """JSON-ready summary: stage totals plus a per-message breakdown."""
+        def stages(entries):
+            ordered = sorted(entries.items(), key=lambda item: -item[1][0])
+            return {name: {"seconds": round(seconds, 4), "calls": calls} for name, (seconds, calls) in ordered}
+        return {
+            "stages": stages(self.totals),
+            "messages": [
+                {"index": index, "name": self.labels.get(index),
+                 "seconds": round(sum(seconds for seconds, _ in entries.values()), 4),
+                 "stages": stages(entries)}
+                for index, entries in sorted(self.messages.items())
+            ],
+        }
+
+    def print_report(self, wall_seconds, log=print):
+        report = self.report()
+        log(f"Profile ({wall_seconds:.2f}s wall):")
+        for name, entry in report["stages"].items():
+            share = 100 * entry["seconds"] / wall_seconds if wall_seconds else 0
+            log(f"  {name:<12} {entry['seconds']:8.3f}s {share:5.1f}%  {entry['calls']:>7} calls")
+        log("Per message:")
+        for msg in report["messages"]:
+            top = ", ".join(f"{name} {entry['seconds']:.3f}" for name, entry in list(msg["stages"].items())[:4])
+            log(f"  #{msg['index'] + 1:<4} {str(msg['name'])[:10]:<10} {msg['seconds']:7.3f}s  ({top})")
+
+PROFILER = StageProfiler()
+
+def wrap_text(draw, text, max_width):
+    return list(TEXT_MEASURE.wrap(text, max_width))
 
 def bubble_size(draw, text, max_width):
-    padding = 18  # iPhone 15 bubble padding
+    padding = px(18)  # iPhone 15 bubble padding
     lines = wrap_text(draw, text, max_width)
-    text_width = max(draw.textlength(l, font=FONT) for l in lines) if lines else 0
-    text_height = max(1, len(lines)) * 44  # iPhone line height
+    text_width = max(TEXT_MEASURE.width(l) for l in lines) if lines else 0
+    text_height = max(1, len(lines)) * px(44)  # iPhone line height
     return (text_width + padding * 2, text_height + padding * 2, lines)
 
+BUBBLE_NAME_OFFSET = 26  # group-chat name label sits this far above its bubble
+
 def draw_bubble(img, draw, text, side, y_offset, name=None, max_width=None, clip_top=None):
-    padding = 18
-    max_width = max_width or (WIDTH - 120)  # More realistic max width
+    padding = px(18)
+    max_width = max_width or (WIDTH - px(120))  # More realistic max width
     bubble_w, bubble_h, lines = bubble_size(draw, text, max_width)
     
     if side == "left":
-        x0 = 20  # More spacing from edge
+        x0 = px(20)  # More spacing from edge
         color = GREY
         txt_color = TEXT_DARK
     else:
-        x0 = WIDTH - bubble_w - 20
+        x0 = WIDTH - bubble_w - px(20)
         color = BLUE
         txt_color = WHITE
     
@@ -294,53 +960,85 @@ def draw_bubble(img, draw, text, side, y_offset, name=None, max_width=None, clip
 
     # Name label for group chats (smaller, more subtle)
     if name and side == "left":
-        name_y = y0 - 26
+        name_y = y0 - BUBBLE_NAME_OFFSET
         if clip_top is None or name_y >= clip_top:
-            draw.text((x0 + 8, name_y), name, font=SMALL_FONT, fill=TEXT_SUBTLE)
+            draw_text(draw, (x0 + px(8), name_y), name, SMALL_FONT, TEXT_SUBTLE, image=img)
 
     # iPhone 15 bubble style with proper radius
-    radius = 22  # iPhone bubble radius
+    radius = px(22)  # iPhone bubble radius
     draw.rounded_rectangle([x0, y0, x0 + bubble_w, y0 + bubble_h], radius, fill=color)
     
     # Tail (more subtle and iPhone-like)
     if side == "left":
-        tail_points = [(x0 + 16, y0 + bubble_h - 8), (x0 - 6, y0 + bubble_h + 4), (x0 + 16, y0 + bubble_h - 20)]
+        tail_points = [(x0 + px(16), y0 + bubble_h - px(8)), (x0 - px(6), y0 + bubble_h + px(4)),
+                       (x0 + px(16), y0 + bubble_h - px(20))]
         draw.polygon(tail_points, fill=color)
     else:
         x1 = x0 + bubble_w
-        tail_points = [(x1 - 16, y0 + bubble_h - 8), (x1 + 6, y0 + bubble_h + 4), (x1 - 16, y0 + bubble_h - 20)]
+        tail_points = [(x1 - px(16), y0 + bubble_h - px(8)), (x1 + px(6), y0 + bubble_h + px(4)),
+                       (x1 - px(16), y0 + bubble_h - px(20))]
         draw.polygon(tail_points, fill=color)
 
     # Text with proper line spacing
     y_text = y0 + padding
     for l in lines:
-        draw.text((x0 + padding, y_text), l, font=FONT, fill=txt_color)
-        y_text += 44
+        draw_text(draw, (x0 + padding, y_text), l, FONT, txt_color, image=img)
+        y_text += px(44)
 
     return bubble_w, bubble_h
 
-def draw_chat_base(draw, title="Chat"):
-    draw_status_bar(draw)
-    draw_header(draw, title=title)
+@functools.lru_cache(maxsize=64)
+def bubble_tile(text, side, name=None):
+    """Render a history bubble once as RGBA tiles that frames can paste.
+
+    Returns ``(bubble, label)``. ``bubble`` holds the rounded rectangle, tail and
+    text; ``label`` holds the optional group-chat name and is kept separate so
+    it can still be clipped at the top of the chat area. Each is a
+    ``(tile, x, dy)`` tuple where ``dy`` is relative to the message's ``y``;
+    ``label`` is None when there is no name to show.
+    """
+    canvas = Image.new("RGBA", (WIDTH, 1), (0, 0, 0, 0))
+    _, bubble_h, _ = bubble_size(ImageDraw.Draw(canvas), text, WIDTH - px(120))
+    # The tail pokes a few pixels below the bubble box
+    canvas = Image.new("RGBA", (WIDTH, bubble_h + px(8)), (0, 0, 0, 0))
+    draw_bubble(canvas, ImageDraw.Draw(canvas), text, side, 0)
+    bubble = _crop_tile(canvas, 0)
+
+    label = None
+    if name and side == "left":
+        canvas = Image.new("RGBA", (WIDTH, BUBBLE_NAME_OFFSET * 3), (0, 0, 0, 0))
+        # Same position draw_bubble uses: (x0 + 8, y0 - BUBBLE_NAME_OFFSET) with x0 = 20
+        draw_text(ImageDraw.Draw(canvas), (px(20) + px(8), 0), name, SMALL_FONT, TEXT_SUBTLE, image=canvas)
+        label = _crop_tile(canvas, -BUBBLE_NAME_OFFSET)
+    return bubble, label
+
+def _crop_tile(canvas, dy):
+    bbox = canvas.getbbox() or (0, 0, 1, 1)
+    return canvas.crop(bbox), bbox[0], bbox[1] + dy
+
+def draw_chat_base(img, draw, title="Chat", time_str=None):
+    draw_status_bar(draw, time_str=time_str)
+    draw_header(img, draw, title=title)
 
 def draw_home_indicator(draw):
     """iPhone 15 home indicator with realistic blur and shadow."""
     cx = WIDTH // 2
-    y = HEIGHT - 18
-    indicator_width = 134
-    indicator_height = 5
+    y = HEIGHT - px(18)
+    indicator_width = px(134)
+    indicator_height = px(5)
 
     # Subtle blurred/gradient background at bottom
-    for i in range(24):
-        alpha = int(255 * (1 - i / 24) * 0.10)
+    gradient_h = px(24)
+    for i in range(gradient_h):
+        alpha = int(255 * (1 - i / gradient_h) * 0.10)
         color = (28, 28, 30, alpha)
-        draw.rectangle([0, HEIGHT - 24 + i, WIDTH, HEIGHT - 24 + i + 1], fill=color)
+        draw.rectangle([0, HEIGHT - gradient_h + i, WIDTH, HEIGHT - gradient_h + i + 1], fill=color)
 
     # Home indicator pill with subtle drop shadow
     shadow_color = (50, 50, 55)
-    draw.rounded_rectangle([cx - indicator_width//2, y - indicator_height//2 + 1,
-                            cx + indicator_width//2, y + indicator_height//2 + 1],
-                           indicator_height//2 + 1, fill=shadow_color)
+    draw.rounded_rectangle([cx - indicator_width//2, y - indicator_height//2 + px(1),
+                            cx + indicator_width//2, y + indicator_height//2 + px(1)],
+                           indicator_height//2 + px(1), fill=shadow_color)
     draw.rounded_rectangle([cx - indicator_width//2, y - indicator_height//2,
                             cx + indicator_width//2, y + indicator_height//2],
                            indicator_height//2, fill=(200, 200, 205))
@@ -353,44 +1051,23 @@ INPUT_INNER_PAD_Y = 8
 INPUT_LINE_HEIGHT = 36
 
 def _wrap_text_for_width(draw, text, max_width):
-    """Word-wrap text to fit max_width using current FONT."""
+    """Word-wrap text to fit max_width using current FONT, hard-wrapping long words."""
     if not text:
         return [""]
-    words = text.split(" ")
-    lines = []
-    line = ""
-    for w in words:
-        candidate = (line + " " + w).strip()
-        if draw.textlength(candidate, font=FONT) <= max_width:
-            line = candidate
-        else:
-            if line:
-                lines.append(line)
-            # If a single word is longer than width, hard-wrap it
-            if draw.textlength(w, font=FONT) > max_width:
-                buf = ""
-                for ch in w:
-                    if draw.textlength(buf + ch, font=FONT) <= max_width:
-                        buf += ch
-                    else:
-                        lines.append(buf)
-                        buf = ch
-                line = buf
-            else:
-                line = w
-    if line:
-        lines.append(line)
-    return lines
+    return list(TEXT_MEASURE.wrap(text, max_width, hard_wrap=True))
 
-def compute_input_layout(draw, text):
-    """Compute dynamic input bar height, y-position, and wrapped lines."""
-    field_width = WIDTH - INPUT_SIDE_MARGIN * 2 - 56  # leave space for send button
+def _input_text_area():
+    """Input field width and the part of it available to text."""
+    field_width = WIDTH - INPUT_SIDE_MARGIN * 2 - px(56)  # leave space for send button
     text_area_width = field_width - INPUT_FIELD_LEFT_ICON_W - INPUT_INNER_PAD_X*2
-    lines_full = _wrap_text_for_width(draw, text, text_area_width) if text else [""]
+    return field_width, text_area_width
+
+def _input_layout_from_lines(lines_full):
+    field_width, text_area_width = _input_text_area()
     lines = lines_full[-MAX_INPUT_LINES:]
     needed_h = INPUT_INNER_PAD_Y*2 + max(1, len(lines)) * INPUT_LINE_HEIGHT
     bar_h = max(INPUT_BAR_H, needed_h)
-    bar_y = HEIGHT - KEYBOARD_H - bar_h - 8
+    bar_y = HEIGHT - KEYBOARD_H - bar_h - px(8)
     return {
         "bar_y": bar_y,
         "bar_h": bar_h,
@@ -399,44 +1076,89 @@ def compute_input_layout(draw, text):
         "text_area_width": text_area_width,
     }
 
-def draw_input_bar(img, draw, text):
+def compute_input_layout(draw, text):
+    """Compute dynamic input bar height, y-position, and wrapped lines."""
+    _, text_area_width = _input_text_area()
+    lines_full = _wrap_text_for_width(draw, text, text_area_width) if text else [""]
+    return _input_layout_from_lines(lines_full)
+
+class InputLayout:
+    """Incremental ``compute_input_layout`` for text that grows while typing.
+
+    Words already followed by a space are placed once and kept; each
+    ``update`` only re-flows the word still being typed onto the open last
+    line. Text that does not extend the previous value starts over.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._lines = []          # Finished lines
+        self._line = ""           # Open last line holding committed words
+        self._line_w = 0.0
+        self._committed = 0       # Index in text after the last placed word
+
+    def update(self, text):
+        """Lay out ``text``; returns the same dict as ``compute_input_layout``."""
+        if not text.startswith(self.text):
+            self.__init__()
+        self.text = text
+        _, text_area_width = _input_text_area()
+        if not text:
+            return _input_layout_from_lines([""])
+
+        last_space = text.rfind(" ")
+        if last_space >= self._committed:
+            for word in text[self._committed:last_space].split(" "):
+                self._line, self._line_w = TEXT_MEASURE.place_word(
+                    self._lines, self._line, self._line_w, word, text_area_width, hard_wrap=True)
+            self._committed = last_space + 1
+
+        spill = []
+        line, _ = TEXT_MEASURE.place_word(
+            spill, self._line, self._line_w, text[self._committed:], text_area_width, hard_wrap=True)
+        tail = self._lines[-MAX_INPUT_LINES:] + spill
+        if line:
+            tail.append(line)
+        return _input_layout_from_lines(tail)
+
+def draw_input_bar(img, draw, text, layout=None):
     """iPhone 15 style input bar with proper styling."""
-    layout = compute_input_layout(draw, text or "")
+    layout = layout or compute_input_layout(draw, text or "")
     bar_y = layout["bar_y"]
     bar_h = layout["bar_h"]
     field_width = layout["field_width"]
     lines = layout["text_lines"]
 
     # Background strip
-    draw.rectangle([0, bar_y - 12, WIDTH, bar_y + bar_h + 12], fill=KEYBOARD_BG)
+    draw.rectangle([0, bar_y - px(12), WIDTH, bar_y + bar_h + px(12)], fill=KEYBOARD_BG)
 
     # Input field with iPhone 15 styling
-    margin = 16
-    field_radius = 25  # More rounded like iOS
+    margin = px(16)
+    field_radius = px(25)  # More rounded like iOS
     
     draw.rounded_rectangle([margin, bar_y, margin + field_width, bar_y + bar_h],
                           field_radius, fill=INPUT_BG)
 
     # Plus icon (more iOS-like)
-    icon_x = margin + 16
-    icon_y = bar_y + (bar_h - 28) // 2
-    icon_size = 28
+    icon_size = px(28)
+    icon_x = margin + px(16)
+    icon_y = bar_y + (bar_h - icon_size) // 2
     
     # Plus icon circle
     draw.ellipse([icon_x, icon_y, icon_x + icon_size, icon_y + icon_size], 
-                outline=(142, 142, 147), width=2)
+                outline=(142, 142, 147), width=px(2))
     
     # Plus symbol
     plus_center_x = icon_x + icon_size // 2
     plus_center_y = icon_y + icon_size // 2
-    draw.line([plus_center_x - 6, plus_center_y, plus_center_x + 6, plus_center_y], 
-             fill=(142, 142, 147), width=2)
-    draw.line([plus_center_x, plus_center_y - 6, plus_center_x, plus_center_y + 6], 
-             fill=(142, 142, 147), width=2)
+    draw.line([plus_center_x - px(6), plus_center_y, plus_center_x + px(6), plus_center_y], 
+             fill=(142, 142, 147), width=px(2))
+    draw.line([plus_center_x, plus_center_y - px(6), plus_center_x, plus_center_y + px(6)], 
+             fill=(142, 142, 147), width=px(2))
 
     # Send button (iPhone 15 style)
-    send_size = 36
-    send_x = WIDTH - margin - send_size - 8
+    send_size = px(36)
+    send_x = WIDTH - margin - send_size - px(8)
     send_y = bar_y + (bar_h - send_size) // 2
     
     # Send button circle
@@ -446,23 +1168,23 @@ def draw_input_bar(img, draw, text):
     arrow_center_x = send_x + send_size // 2
     arrow_center_y = send_y + send_size // 2
     arrow_points = [
-        (arrow_center_x, arrow_center_y - 8),
-        (arrow_center_x - 6, arrow_center_y - 2),
-        (arrow_center_x - 2, arrow_center_y - 2),
-        (arrow_center_x - 2, arrow_center_y + 8),
-        (arrow_center_x + 2, arrow_center_y + 8),
-        (arrow_center_x + 2, arrow_center_y - 2),
-        (arrow_center_x + 6, arrow_center_y - 2)
+        (arrow_center_x, arrow_center_y - px(8)),
+        (arrow_center_x - px(6), arrow_center_y - px(2)),
+        (arrow_center_x - px(2), arrow_center_y - px(2)),
+        (arrow_center_x - px(2), arrow_center_y + px(8)),
+        (arrow_center_x + px(2), arrow_center_y + px(8)),
+        (arrow_center_x + px(2), arrow_center_y - px(2)),
+        (arrow_center_x + px(6), arrow_center_y - px(2))
     ]
     draw.polygon(arrow_points, fill=WHITE)
 
     # Text with proper positioning
     if lines:
-        text_x = margin + 56  # Account for plus icon
-        text_y = bar_y + (bar_h - len(lines) * 36) // 2 + 6
+        text_x = margin + px(56)  # Account for plus icon
+        text_y = bar_y + (bar_h - len(lines) * INPUT_LINE_HEIGHT) // 2 + px(6)
         for l in lines:
-            draw.text((text_x, text_y), l, font=FONT, fill=WHITE)
-            text_y += 36
+            draw_text(draw, (text_x, text_y), l, FONT, WHITE, image=img)
+            text_y += INPUT_LINE_HEIGHT
 
 # Updated keyboard layout with proper positioning
 KEY_ROWS = [
@@ -474,57 +1196,114 @@ KEY_ROWS = [
 def _compute_key_positions():
     positions = {}
     kb_top = HEIGHT - KEYBOARD_H
-    key_height = 54
-    row_spacing = 12
+    key_height = px(54)
+    row_spacing = px(12)
+    key_gap = px(8)
     
     # Letter rows
     for r, row in enumerate(KEY_ROWS):
-        key_width = 66 if r < 2 else 74  # Slightly wider for bottom row
-        total_width = len(row) * key_width + (len(row) - 1) * 8
+        key_width = px(66) if r < 2 else px(74)  # Slightly wider for bottom row
+        total_width = len(row) * key_width + (len(row) - 1) * key_gap
         x_start = (WIDTH - total_width) // 2
         
         # Offset middle row slightly
         if r == 1:
-            x_start += 16
+            x_start += px(16)
         elif r == 2:
-            x_start += 32
+            x_start += px(32)
             
-        y = kb_top + 12 + r * (key_height + row_spacing)
+        y = kb_top + px(12) + r * (key_height + row_spacing)
         
         for i, char in enumerate(row):
-            x = x_start + i * (key_width + 8)
+            x = x_start + i * (key_width + key_gap)
             positions[char] = (x, y, x + key_width, y + key_height)
             positions[char.lower()] = (x, y, x + key_width, y + key_height)
     
     # Special bottom row
-    y = kb_top + 12 + 3 * (key_height + row_spacing)
+    y = kb_top + px(12) + 3 * (key_height + row_spacing)
     
     # Shift key
-    shift_width = 84
-    positions['shift'] = (16, y, 16 + shift_width, y + key_height)
+    shift_width = px(84)
+    positions['shift'] = (px(16), y, px(16) + shift_width, y + key_height)
     
     # Delete key  
-    delete_width = 84
-    delete_x = WIDTH - 16 - delete_width
+    delete_width = px(84)
+    delete_x = WIDTH - px(16) - delete_width
     positions['delete'] = (delete_x, y, delete_x + delete_width, y + key_height)
     
     # Space row
     space_y = y + key_height + row_spacing
-    positions['123'] = (16, space_y, 90, space_y + key_height)
-    positions[' '] = (98, space_y, WIDTH - 172, space_y + key_height)
-    positions['return'] = (WIDTH - 164, space_y, WIDTH - 16, space_y + key_height)
+    positions['123'] = (px(16), space_y, px(90), space_y + key_height)
+    positions[' '] = (px(98), space_y, WIDTH - px(172), space_y + key_height)
+    positions['return'] = (WIDTH - px(164), space_y, WIDTH - px(16), space_y + key_height)
     
     return positions, kb_top
 
 KEY_POSITIONS, KB_TOP = _compute_key_positions()
 
+def _draw_key(draw, key_name, rect, fill_color):
+    """Draw a single key (background, shadow and label) inside ``rect``."""
+    x0, y0, x1, y1 = rect
+    # Key background with proper radius
+    key_radius = px(10)  # iPhone key radius
+    draw.rounded_rectangle([x0, y0, x1, y1], key_radius, fill=fill_color)
+    
+    # Subtle key shadow (bottom edge)
+    shadow_color = (20, 20, 22)
+    draw.rounded_rectangle([x0, y1 - px(2), x1, y1], key_radius, fill=shadow_color)
+    draw.rounded_rectangle([x0, y0, x1, y1 - px(2)], key_radius, fill=fill_color)
+    
+    # Key labels with proper positioning
+    label_x = (x0 + x1) // 2
+    label_y = (y0 + y1) // 2 - px(16)
+    
+    if key_name == 'shift':
+        # Shift arrow (more iOS-like)
+        arrow_points = [
+            (label_x, label_y + px(6)),
+            (label_x - px(8), label_y + px(14)),
+            (label_x - px(4), label_y + px(14)),
+            (label_x - px(4), label_y + px(22)),
+            (label_x + px(4), label_y + px(22)),
+            (label_x + px(4), label_y + px(14)),
+            (label_x + px(8), label_y + px(14))
+        ]
+        draw.polygon(arrow_points, fill=WHITE)
+    elif key_name == 'delete':
+        # Delete icon (backspace - more refined)
+        delete_points = [
+            (label_x - px(10), label_y + px(14)),
+            (label_x - px(6), label_y + px(10)),
+            (label_x + px(8), label_y + px(10)),
+            (label_x + px(8), label_y + px(18)),
+            (label_x - px(6), label_y + px(18))
+        ]
+        draw.polygon(delete_points, fill=WHITE)
+        # X mark in delete key
+        draw.line([label_x - px(2), label_y + px(12), label_x + px(4), label_y + px(16)], fill=KEYBOARD_BG, width=px(2))
+        draw.line([label_x + px(4), label_y + px(12), label_x - px(2), label_y + px(16)], fill=KEYBOARD_BG, width=px(2))
+    elif key_name == '123':
+        text_width = draw.textlength("123", font=SMALL_FONT)
+        draw_text(draw, (label_x - text_width // 2, label_y + px(2)), "123", SMALL_FONT, WHITE)
+    elif key_name == 'return':
+        text_width = draw.textlength("return", font=SMALL_FONT)
+        draw_text(draw, (label_x - text_width // 2, label_y + px(2)), "return", SMALL_FONT, WHITE)
+    elif key_name == ' ':
+        # Space bar gets "space" label
+        space_width = draw.textlength("space", font=SMALL_FONT)
+        draw_text(draw, (label_x - space_width // 2, label_y + px(2)), "space", SMALL_FONT, (160, 160, 165))
+    else:
+        # Regular letter keys
+        text_width = draw.textlength(key_name, font=FONT)
+        draw_text(draw, (label_x - text_width // 2, label_y), key_name, FONT, WHITE)
+
 def draw_keyboard(draw, highlight=None):
     """iPhone 15 style keyboard with proper key styling."""
     # Keyboard background
     draw.rectangle([0, KB_TOP, WIDTH, HEIGHT], fill=KEYBOARD_BG)
     
     # Draw all keys with iPhone 15 styling
-    for key_name, (x0, y0, x1, y1) in KEY_POSITIONS.items():
+    for key_name, rect in KEY_POSITIONS.items():
         if key_name.islower():
             continue
             
@@ -532,143 +1311,452 @@ def draw_keyboard(draw, highlight=None):
         fill_color = KEY_FILL
         if highlight and (key_name == highlight or key_name.lower() == highlight.lower()):
             fill_color = KEY_HL
-            
-        # Key background with proper radius
-        key_radius = 10  # iPhone key radius
-        draw.rounded_rectangle([x0, y0, x1, y1], key_radius, fill=fill_color)
-        
-        # Subtle key shadow (bottom edge)
-        shadow_color = (20, 20, 22)
-        draw.rounded_rectangle([x0, y1 - 2, x1, y1], key_radius, fill=shadow_color)
-        draw.rounded_rectangle([x0, y0, x1, y1 - 2], key_radius, fill=fill_color)
-        
-        # Key labels with proper positioning
-        label_x = (x0 + x1) // 2
-        label_y = (y0 + y1) // 2 - 16
-        
-        if key_name == 'shift':
-            # Shift arrow (more iOS-like)
-            arrow_points = [
-                (label_x, label_y + 6),
-                (label_x - 8, label_y + 14),
-                (label_x - 4, label_y + 14),
-                (label_x - 4, label_y + 22),
-                (label_x + 4, label_y + 22),
-                (label_x + 4, label_y + 14),
-                (label_x + 8, label_y + 14)
-            ]
-            draw.polygon(arrow_points, fill=WHITE)
-        elif key_name == 'delete':
-            # Delete icon (backspace - more refined)
-            delete_points = [
-                (label_x - 10, label_y + 14),
-                (label_x - 6, label_y + 10),
-                (label_x + 8, label_y + 10),
-                (label_x + 8, label_y + 18),
-                (label_x - 6, label_y + 18)
-            ]
-            draw.polygon(delete_points, fill=WHITE)
-            # X mark in delete key
-            draw.line([label_x - 2, label_y + 12, label_x + 4, label_y + 16], fill=KEYBOARD_BG, width=2)
-            draw.line([label_x + 4, label_y + 12, label_x - 2, label_y + 16], fill=KEYBOARD_BG, width=2)
-        elif key_name == '123':
-            text_width = draw.textlength("123", font=SMALL_FONT)
-            draw.text((label_x - text_width // 2, label_y + 2), "123", font=SMALL_FONT, fill=WHITE)
-        elif key_name == 'return':
-            text_width = draw.textlength("return", font=SMALL_FONT)
-            draw.text((label_x - text_width // 2, label_y + 2), "return", font=SMALL_FONT, fill=WHITE)
-        elif key_name == ' ':
-            # Space bar gets "space" label
-            space_width = draw.textlength("space", font=SMALL_FONT)
-            draw.text((label_x - space_width // 2, label_y + 2), "space", 
-                     font=SMALL_FONT, fill=(160, 160, 165))
-        else:
-            # Regular letter keys
-            text_width = draw.textlength(key_name, font=FONT)
-            draw.text((label_x - text_width // 2, label_y), key_name, font=FONT, fill=WHITE)
+        _draw_key(draw, key_name, rect, fill_color)
 
-def render_chat_frame(history, typing=None, title="Chat", input_text=None, highlight_key=None):
-    """Render a chat frame with proper layout."""
-    img = Image.new("RGB", (WIDTH, HEIGHT), CHAT_BG)
-    draw = ImageDraw.Draw(img)
-    
-    # Draw content first; draw header/status last so they stay above content
-    content_top = CHAT_TOP_Y + TOP_PADDING
-    
+# --- Cached chrome layers ---------------------------------------------------
+# The status bar, header, keyboard and home indicator hardly ever change within
+# a story, so each is rendered once per state and pasted onto every frame.
+_CHROME_LAYERS = {}
+_CHROME_CACHE_MAX = 16
+HOME_INDICATOR_H = 24  # rows covered by draw_home_indicator's bottom gradient
+
+def _cached_layer(key, paint, box):
+    """Return the ``box`` region of a frame painted by ``paint``, cached by ``key``."""
+    layer = _CHROME_LAYERS.get(key)
+    if layer is None:
+        if len(_CHROME_LAYERS) >= _CHROME_CACHE_MAX:
+            _CHROME_LAYERS.pop(next(iter(_CHROME_LAYERS)))
+        img = Image.new("RGB", (WIDTH, HEIGHT), CHAT_BG)
+        paint(img, ImageDraw.Draw(img))
+        layer = _CHROME_LAYERS[key] = img.crop(box)
+    return layer
+
+def top_chrome_layer(title):
+    """Status bar and header for ``title`` at the current battery/clock state."""
+    time_str = current_time_str()
+    def paint(img, draw):
+        draw_chat_base(img, draw, title=title, time_str=time_str)
+    return _cached_layer(('top', title, BATTERY_LEVEL, time_str), paint, (0, 0, WIDTH, CHAT_TOP_Y + 1))
+
+def keyboard_layer():
+    """Keyboard with no key pressed."""
+    return _cached_layer(('keyboard',), lambda img, draw: draw_keyboard(draw), (0, KB_TOP, WIDTH, HEIGHT))
+
+def home_indicator_layer():
+    return _cached_layer(('home',), lambda img, draw: draw_home_indicator(draw),
+                         (0, HEIGHT - HOME_INDICATOR_H, WIDTH, HEIGHT))
+
+def key_sprites():
+    """Pressed-key patches keyed by key name (any letter case), with their paste origin.
+
+    Keys never overlap, so one keyboard drawn with every key highlighted is
+    enough to crop a patch for each of them.
+    """
+    sprites = _CHROME_LAYERS.get(('key_sprites',))
+    if sprites is None:
+        img = Image.new("RGB", (WIDTH, HEIGHT), CHAT_BG)
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([0, KB_TOP, WIDTH, HEIGHT], fill=KEYBOARD_BG)
+        drawn = [name for name in KEY_POSITIONS if not name.islower()]
+        for key_name in drawn:
+            _draw_key(draw, key_name, KEY_POSITIONS[key_name], KEY_HL)
+        sprites = {}
+        for key_name in drawn:
+            x0, y0, x1, y1 = KEY_POSITIONS[key_name]
+            sprite = (img.crop((x0, y0, x1 + 1, y1 + 1)), (x0, y0))
+            sprites[key_name] = sprites[key_name.lower()] = sprite
+        _CHROME_LAYERS[('key_sprites',)] = sprites
+    return sprites
+
+# Design (720x1280) values of every layout constant that configure_layout() rescales
+_DESIGN_LAYOUT = {name: globals()[name] for name in (
+    "STATUS_BAR_H", "HEADER_H", "TOP_PADDING", "BOTTOM_SAFE", "INPUT_BAR_H", "KEYBOARD_H",
+    "INPUT_SIDE_MARGIN", "INPUT_FIELD_LEFT_ICON_W", "INPUT_INNER_PAD_X", "INPUT_INNER_PAD_Y",
+    "INPUT_LINE_HEIGHT", "HOME_INDICATOR_H", "BUBBLE_NAME_OFFSET",
+)}
+_DESIGN_SIZE = (WIDTH, HEIGHT)
+
+class Layout:
+    """Output frame size and the scale applied to the 720x1280 design.
+
+    Fonts and geometry scale by whichever of width or height is relatively
+    smaller. For another aspect ratio the header stays anchored to the top and
+    the keyboard to the bottom, and the chat area absorbs the difference.
+    Dimensions are rounded down to even numbers for yuv420p.
+    """
+
+    def __init__(self, width, height):
+        if width < 2 or height < 2:
+            raise ValueError(f"resolution too small: {width}x{height}")
+        self.width = width // 2 * 2
+        self.height = height // 2 * 2
+        design_w, design_h = _DESIGN_SIZE
+        self.scale = min(self.width / design_w, self.height / design_h)
+        if (self.width, self.height) == _DESIGN_SIZE:
+            self.scale = 1
+
+    @classmethod
+    def parse(cls, value):
+        """Layout for a preset name (``"1080p"``) or a ``WIDTHxHEIGHT`` string."""
+        size = RESOLUTION_PRESETS.get(value.lower())
+        if size is None:
+            match = re.fullmatch(r"\s*(\d+)\s*[xX]\s*(\d+)\s*", value)
+            if not match:
+                raise ValueError(f"resolution must be WIDTHxHEIGHT or one of {', '.join(RESOLUTION_PRESETS)}: {value!r}")
+            size = int(match.group(1)), int(match.group(2))
+        return cls(*size)
+
+    def scaled(self, factor):
+        """The same aspect ratio at ``factor`` times the size (e.g. for previews)."""
+        return Layout(int(round(self.width * factor)), int(round(self.height * factor)))
+
+    def __repr__(self):
+        return f"Layout({self.width}x{self.height}, scale={self.scale:.3g})"
+
+LAYOUT = Layout(WIDTH, HEIGHT)
+
+def configure_layout(layout):
+    """Re-derive frame size, layout constants, key positions and fonts for ``layout``.
+
+    Everything cached at the old size (chrome layers, bubble tiles, text
+    measurements) is dropped.
+    """
+    global LAYOUT, SCALE, WIDTH, HEIGHT, CHAT_TOP_Y, KEY_POSITIONS, KB_TOP
+    LAYOUT = layout
+    SCALE = layout.scale
+    WIDTH, HEIGHT = layout.width, layout.height
+    globals().update({name: px(v) for name, v in _DESIGN_LAYOUT.items()})
+    CHAT_TOP_Y = STATUS_BAR_H + HEADER_H
+    KEY_POSITIONS, KB_TOP = _compute_key_positions()
+    load_fonts()
+    _CHROME_LAYERS.clear()
+    _GLYPH_ATLASES.clear()
+    bubble_tile.cache_clear()
+    TEXT_MEASURE.clear()
+
+class HistoryEntry:
+    """One bubble of a chat history; ``name`` is its label (None when not shown)."""
+    # No rendered tile is kept here: bubble_tile's bounded cache holds the visible
+    # ones, so memory stays flat however long the chat grows
+    __slots__ = ('name', 'text', 'side', 'y', 'height')
+
+    def __init__(self, name, text, side, y, height):
+        self.name = name
+        self.text = text
+        self.side = side
+        self.y = y
+        self.height = height
+
+    def __reduce__(self):
+        return HistoryEntry, (self.name, self.text, self.side, self.y, self.height)
+
+class ChatHistory:
+    """A chat's ``HistoryEntry`` objects, with their ``y`` positions indexed for culling.
+
+    Entries are appended in reading order, so ``y`` only grows: ``ys`` stays
+    sorted and the bubbles inside a viewport are found by bisection, and
+    ``bottoms[i]`` is the content bottom of the first ``i + 1`` entries.
+    History only grows, so a prefix slice (``history[:count]``) is a view
+    sharing the same storage rather than a copy.
+    """
+    __slots__ = ('_entries', 'ys', 'bottoms', '_count')
+
+    def __init__(self, entries=()):
+        self._entries = []
+        self.ys = array('i')
+        self.bottoms = array('i')
+        self._count = None  # Set on prefix views
+        for msg in entries:
+            self.append(msg)
+
+    def append(self, msg):
+        if self._count is not None:
+            raise TypeError("cannot append to a history prefix view")
+        bottom = msg.y + msg.height
+        self._entries.append(msg)
+        self.ys.append(msg.y)
+        self.bottoms.append(max(bottom, self.bottoms[-1]) if self.bottoms else bottom)
+
+    def __len__(self):
+        return len(self._entries) if self._count is None else self._count
+
+    def __iter__(self):
+        return itertools.islice(self._entries, len(self))
+
+    def __getitem__(self, key):
+        n = len(self)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(n)
+            if start or step != 1:
+                return ChatHistory(self._entries[start:stop:step])
+            view = ChatHistory.__new__(ChatHistory)
+            view._entries, view.ys, view.bottoms, view._count = self._entries, self.ys, self.bottoms, stop
+            return view
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError("history index out of range")
+        return self._entries[key]
+
+    def __reduce__(self):
+        return ChatHistory, (list(self),)
+
+    def window(self, top, bottom):
+        """Index range of the entries with ``top <= y <= bottom``."""
+        n = len(self)
+        return bisect.bisect_left(self.ys, top, 0, n), bisect.bisect_right(self.ys, bottom, 0, n)
+
+def content_bottom(history):
+    """Lowest bubble edge in ``history`` (at least the top of the chat area)."""
+    bottom = CHAT_TOP_Y + TOP_PADDING
+    if isinstance(history, ChatHistory):
+        return max(bottom, history.bottoms[len(history) - 1]) if history else bottom
+    for msg in history:
+        bottom = max(bottom, msg.y + msg.height)
+    return bottom
+
+class ChatCanvas:
+    """One tall, growing canvas holding a whole chat at absolute ``y`` (scroll-buffer mode).
+
+    Each history bubble is pasted onto it once; a frame's chat area is then a
+    single row slice at the scroll offset, so frame cost no longer depends on
+    how long the history is.
+    """
+
+    def __init__(self):
+        self.pixels = np.empty((0, WIDTH, 3), dtype=np.uint8)
+        self.content_bottom = CHAT_TOP_Y + TOP_PADDING
+        self._count = 0
+        self._last = None
+
+    def _reserve(self, rows):
+        if rows <= len(self.pixels):
+            return
+        grown = np.empty((max(rows, 2 * len(self.pixels), HEIGHT), WIDTH, 3), dtype=np.uint8)
+        grown[:] = CHAT_BG
+        grown[:len(self.pixels)] = self.pixels
+        self.pixels = grown
+
+    def _paste(self, tile, x, y):
+        """Alpha-paste ``tile`` at canvas ``(x, y)`` through Pillow so blending matches frames."""
+        self._reserve(y + tile.height)
+        y0 = max(0, y)
+        region = Image.fromarray(self.pixels[y0:y + tile.height])
+        region.paste(tile, (x, y - y0), tile)
+        self.pixels[y0:y + tile.height] = np.asarray(region)
+
+    def sync(self, history):
+        """Draw any history entries appended since the last call.
+
+        ``history`` normally only grows; if it no longer extends what is on the
+        canvas (a different or shortened list) the canvas is rebuilt.
+        """
+        if len(history) < self._count or (self._count and history[self._count - 1] is not self._last):
+            self.__init__()
+        for msg in history[self._count:]:
+            bubble, label = bubble_tile(msg.text, msg.side, msg.name)
+            # Label first: the bubble overlaps its bottom edge, as in draw_bubble
+            if label:
+                tile, x, dy = label
+                self._paste(tile, x, msg.y + dy)
+            tile, x, dy = bubble
+            self._paste(tile, x, msg.y + dy)
+            self.content_bottom = max(self.content_bottom, msg.y + msg.height)
+        self._count = len(history)
+        self._last = history[-1] if history else None
+
+    def paste_view(self, img, scroll_offset, top, bottom):
+        """Copy canvas rows ``[top, bottom)`` shifted by ``scroll_offset`` onto ``img``."""
+        self._reserve(bottom + scroll_offset)
+        view = self.pixels[top + scroll_offset:bottom + scroll_offset]  # Row slice: no copy
+        img.paste(Image.frombuffer("RGB", (WIDTH, bottom - top), view, "raw", "RGB", 0, 1), (0, top))
+
+def frame_geometry(history, typing=None, input_text=None, canvas=None, input_layout=None):
+    """Viewport and scroll position of a frame, as used by ``render_chat_frame``.
+
+    Returns a dict with ``layout`` (the input bar layout, or None without a
+    keyboard), ``viewport_bottom`` and ``scroll_offset``. A ``canvas`` is
+    synced with ``history`` on the way.
+    """
     # Calculate available space
-    keyboard_visible = input_text is not None
-    if keyboard_visible:
-        layout = compute_input_layout(draw, input_text or "")
-        viewport_bottom = layout["bar_y"] - 12
+    layout = None
+    if input_text is not None:
+        layout = input_layout or compute_input_layout(None, input_text or "")
+        viewport_bottom = layout["bar_y"] - px(12)
     else:
-        viewport_bottom = HEIGHT - BOTTOM_SAFE - 16
+        viewport_bottom = HEIGHT - BOTTOM_SAFE - px(16)
     
     # Simplified content height calculation - no redundant image creation
-    content_bottom = CHAT_TOP_Y + TOP_PADDING
-    for msg in history:
-        content_bottom = max(content_bottom, msg['y'] + msg.get('height', 60))
+    if canvas is not None:
+        canvas.sync(history)
+        bottom = canvas.content_bottom
+    else:
+        bottom = content_bottom(history)
     
     if typing and typing.get('type') == 'dots':
-        content_bottom = max(content_bottom, typing['y'] + 60)
+        bottom = max(bottom, typing['y'] + px(60))
     
-    scroll_offset = max(0, content_bottom + 20 - viewport_bottom)
+    return {
+        "layout": layout,
+        "viewport_bottom": viewport_bottom,
+        "scroll_offset": max(0, bottom + px(20) - viewport_bottom),
+    }
+
+def _draw_typing_dots(img, draw, typing, scroll_offset, dots_only=False):
+    """Typing-indicator bubble with its dots, and the sender's name above it.
+
+    ``dots_only`` draws just the dots onto an already drawn bubble; they are
+    opaque, so dots that are already there are redrawn unchanged.
+    """
+    bubble_w, bubble_h = px(80), px(48)
+    x0 = px(16)
+    y0 = max(typing['y'] - scroll_offset, CHAT_TOP_Y + TOP_PADDING)
+    if not dots_only:
+        draw.rounded_rectangle([x0, y0, x0 + bubble_w, y0 + bubble_h], px(20), fill=GREY)
+    
+    # Animated dots
+    dot_r = px(4)
+    for j in range(typing.get('dots', 0)):
+        dot_x = x0 + px(20) + j * px(20)
+        dot_y = y0 + px(24)
+        draw.ellipse([dot_x - dot_r, dot_y - dot_r, dot_x + dot_r, dot_y + dot_r], fill=(174, 174, 178))
+    
+    if not dots_only and typing.get('name'):
+        draw_text(draw, (x0 + px(6), y0 - px(28)), typing['name'], SMALL_FONT, TEXT_SUBTLE, image=img)
+
+def _draw_input_and_keyboard(img, draw, input_text, layout, highlight_key):
+    """Input bar, then the keyboard (which covers the bottom of the bar's strip) and pressed key."""
+    draw_input_bar(img, draw, input_text, layout)
+    PROFILER.lap('input_bar')
+    img.paste(keyboard_layer(), (0, KB_TOP))
+    sprite = key_sprites().get(highlight_key) if highlight_key else None
+    if sprite:
+        img.paste(*sprite)
+
+def render_chat_frame(history, typing=None, title="Chat", input_text=None, highlight_key=None, canvas=None,
+                      input_layout=None, out=None, geometry=None):
+    """Render a chat frame with proper layout.
+
+    With a ``ChatCanvas`` the chat area is cropped from it instead of pasting
+    each visible bubble. ``input_layout`` is a precomputed layout for
+    ``input_text`` (see ``InputLayout``). ``out`` is an existing frame-sized
+    RGB image to clear and draw into instead of allocating a new one, and
+    ``geometry`` the already computed ``frame_geometry`` (see
+    ``FrameRenderer``).
+    """
+    PROFILER.begin()
+    if out is not None:
+        img = out
+        img.paste(CHAT_BG, (0, 0, WIDTH, HEIGHT))
+    else:
+        img = Image.new("RGB", (WIDTH, HEIGHT), CHAT_BG)
+    draw = ImageDraw.Draw(img)
+    
+    # Draw content first; draw header/status last so they stay above content
+    content_top = CHAT_TOP_Y + TOP_PADDING
+    geometry = geometry or frame_geometry(history, typing, input_text, canvas, input_layout)
+    layout = geometry["layout"]
+    keyboard_visible = layout is not None
+    viewport_bottom = geometry["viewport_bottom"]
+    scroll_offset = geometry["scroll_offset"]
+    PROFILER.lap('frame_setup')
     
     # Draw messages (simplified culling)
-    for msg in history:
-        y_draw = msg['y'] - scroll_offset
-        if y_draw > viewport_bottom + 100:  # Simple cull check
+    if canvas is not None:
+        # Rows above the header bottom and below the viewport are covered later
+        chat_bottom = viewport_bottom if keyboard_visible else HEIGHT - HOME_INDICATOR_H
+        canvas.paste_view(img, scroll_offset, CHAT_TOP_Y + 1, chat_bottom)
+        history = ()
+    first, last = 0, len(history)
+    if isinstance(history, ChatHistory):
+        # Only the bubbles the cull checks below would keep
+        first, last = history.window(content_top - px(100) + scroll_offset, viewport_bottom + px(100) + scroll_offset)
+    for i in range(first, last):
+        msg = history[i]
+        y_draw = msg.y - scroll_offset
+        if y_draw > viewport_bottom + px(100):  # Simple cull check
             continue
-        if y_draw < content_top - 100:
+        if y_draw < content_top - px(100):
             continue
-        draw_bubble(img, draw, msg['text'], msg['side'], y_draw, name=msg.get('name'), clip_top=content_top)
+        bubble, label = bubble_tile(msg.text, msg.side, msg.name)
+        # Label first: the bubble overlaps its bottom edge, as in draw_bubble
+        if label and y_draw - BUBBLE_NAME_OFFSET >= content_top:
+            tile, x, dy = label
+            img.paste(tile, (x, y_draw + dy), tile)
+        tile, x, dy = bubble
+        img.paste(tile, (x, y_draw + dy), tile)
     
     # Typing indicator
     if typing and typing.get('type') == 'dots':
-        bubble_w, bubble_h = 80, 48
-        x0 = 16
-        y0 = typing['y'] - scroll_offset
-        if y0 < content_top:
-            y0 = content_top
-        draw.rounded_rectangle([x0, y0, x0 + bubble_w, y0 + bubble_h], 20, fill=GREY)
-        
-        # Animated dots
-        for j in range(typing.get('dots', 0)):
-            dot_x = x0 + 20 + j * 20
-            dot_y = y0 + 24
-            draw.ellipse([dot_x - 4, dot_y - 4, dot_x + 4, dot_y + 4], fill=(174, 174, 178))
-        
-        if typing.get('name'):
-            draw.text((x0 + 6, y0 - 28), typing['name'], font=SMALL_FONT, fill=TEXT_SUBTLE)
+        _draw_typing_dots(img, draw, typing, scroll_offset)
+    PROFILER.lap('bubbles')
     
-    # Input and keyboard
+    # Input and keyboard; static chrome is pasted from cached layers
     if keyboard_visible:
-        draw_input_bar(img, draw, input_text)
-        draw_keyboard(draw, highlight=highlight_key)
+        _draw_input_and_keyboard(img, draw, input_text, layout, highlight_key)
     else:
-        draw_home_indicator(draw)
+        img.paste(home_indicator_layer(), (0, HEIGHT - HOME_INDICATOR_H))
+    PROFILER.lap('keyboard')
     
-    draw_chat_base(draw, title=title)
+    img.paste(top_chrome_layer(title), (0, 0))
+    PROFILER.lap('chrome')
     return img
 
-def typing_indicator(name, y_offset=CHAT_TOP_Y + TOP_PADDING + 40, title="Chat", history=None):
-    """Slightly slower typing dots animation."""
-    history = history or []
-    frames = []
+class FrameSpec:
+    """Inputs of one ``render_chat_frame`` call, captured when the frame is scheduled.
+
+    The history length is recorded too, so a frame can be rendered after more
+    messages have been appended to the same list.
+    """
+
+    def __init__(self, history, typing=None, title="Chat", input_text=None, highlight_key=None,
+                 canvas=None, input_layout=None):
+        self.history = history
+        self.count = len(history)
+        self.typing = typing
+        self.title = title
+        self.input_text = input_text
+        self.highlight_key = highlight_key
+        self.canvas = canvas
+        self.input_layout = input_layout
+
+    def key(self):
+        """Identity of the pixels this spec produces."""
+        typing = tuple(sorted(self.typing.items())) if self.typing else None
+        return (id(self.history), self.count, typing, self.title, self.input_text, self.highlight_key)
+
+    def render(self, out=None):
+        history = self.history if len(self.history) == self.count else self.history[:self.count]
+        return render_chat_frame(history, typing=self.typing, title=self.title, input_text=self.input_text,
+                                 highlight_key=self.highlight_key, canvas=self.canvas,
+                                 input_layout=self.input_layout, out=out)
+
+def typing_indicator(name, y_offset=None, title="Chat", history=None, canvas=None):
+    """Slightly slower typing dots animation.
+
+    Yields ``(FrameSpec, duration)`` pairs.
+    """
+    history = history if history is not None else []
+    if y_offset is None:
+        y_offset = CHAT_TOP_Y + TOP_PADDING + px(40)
     # Keep 2 frames but slightly longer duration
     for i in range(1, 3):
-        img = render_chat_frame(
+        spec = FrameSpec(
             history,
             typing={"type": "dots", "name": name, "y": y_offset, "dots": i},
-            title=title
+            title=title,
+            canvas=canvas
         )
-        frames.append(ImageClip(np.array(img)).set_duration(0.5))  # Slower: 0.3 -> 0.5
-    return concatenate_videoclips(frames)
+        yield spec, 0.5  # Slower: 0.3 -> 0.5
+
+def typing_keyboard(text, title="Chat", history=None, canvas=None):
+    """Slightly slower keyboard typing animation for more realism.
 
-def typing_keyboard(text, title="Chat", history=None):
-    """Slightly slower keyboard typing animation for more realism."""
-    history = history or []
-    frames = []
+    Yields ``(FrameSpec, duration)`` pairs.
+    """
+    history = history if history is not None else []
     typed = ""
+    input_layout = InputLayout()
     
     # Skip every other character but with slightly longer durations
     for i, char in enumerate(text):
@@ -680,184 +1768,1552 @@ def typing_keyboard(text, title="Chat", history=None):
             elif char.isalpha():
                 highlight = char.upper()
             
-            img = render_chat_frame(history, title=title, input_text=typed, highlight_key=highlight)
-            frames.append(ImageClip(np.array(img)).set_duration(0.08))  # Slightly slower: 0.05 -> 0.08
+            with PROFILER.stage('input_bar'):
+                layout = input_layout.update(typed)
+            spec = FrameSpec(history, title=title, input_text=typed, highlight_key=highlight, canvas=canvas,
+                             input_layout=layout)
+            yield spec, 0.08  # Slightly slower: 0.05 -> 0.08
     
     # Final frame with complete text (longer pause)
-    img = render_chat_frame(history, title=title, input_text=text)
-    frames.append(ImageClip(np.array(img)).set_duration(0.4))  # Longer pause: 0.2 -> 0.4
-    
-    return concatenate_videoclips(frames)
+    spec = FrameSpec(history, title=title, input_text=text, canvas=canvas,
+                     input_layout=input_layout.update(text))
+    yield spec, 0.4  # Longer pause: 0.2 -> 0.4
 
-def main():
-    global ME_NAME, dialogue
-    args = parse_args()
+class FrameRenderer:
+    """Render frame specs into one persistent buffer, redrawing only what changed.
 
-    print("Loading script and initializing...")
-    script_me = script_title = script_type = script_contact = None
-    if args.script:
-        print(f"Loading script from: {args.script}")
-        script_me, script_title, loaded, script_type, script_contact = load_script(args.script)
-        dialogue = loaded
-        print(f"Loaded {len(dialogue)} messages")
-    
+    Consecutive keyboard frames over the same chat view differ only in the
+    input bar and the pressed key, and consecutive typing-dots frames only in
+    added dots, so those are redrawn in place. Any other change (history,
+    title, scroll offset, input bar height, dots position or fewer dots)
+    falls back to a full ``render_chat_frame`` into the buffer. The returned image is
+    overwritten by the next ``render``.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.full = 0
+        self.partial = 0
+        self._base = None
+        self._history = None  # Keeps the history id in _base from being reused
+        self._dots = None
+
+    def render(self, spec):
+        if self.frame is None or self.frame.size != (WIDTH, HEIGHT):
+            self.frame = Image.new("RGB", (WIDTH, HEIGHT), CHAT_BG)
+            self._base = None
+        history = spec.history if len(spec.history) == spec.count else spec.history[:spec.count]
+        typing = spec.typing if spec.typing and spec.typing.get('type') == 'dots' else None
+        geometry = frame_geometry(history, typing, spec.input_text, spec.canvas, spec.input_layout)
+        layout = geometry["layout"]
+        base = (id(spec.history), spec.count, id(spec.canvas), spec.title, geometry["scroll_offset"],
+                layout and (layout["bar_y"], layout["bar_h"]),
+                typing and (typing['y'], typing.get('name')))
+        dots = typing.get('dots', 0) if typing else None
+        if base != self._base or (dots is not None and dots < self._dots):
+            render_chat_frame(history, typing=spec.typing, title=spec.title, input_text=spec.input_text,
+                              highlight_key=spec.highlight_key, canvas=spec.canvas,
+                              input_layout=spec.input_layout, out=self.frame, geometry=geometry)
+            self.full += 1
+        else:
+            PROFILER.begin()
+            draw = ImageDraw.Draw(self.frame)
+            if dots is not None and dots != self._dots:
+                # Redrawing the bubble would cover the tail of the name label above it
+                _draw_typing_dots(self.frame, draw, typing, geometry["scroll_offset"], dots_only=True)
+                PROFILER.lap('bubbles')
+            if layout is not None:
+                # The bar's opaque strip covers the old text; the keyboard covers its bottom edge
+                _draw_input_and_keyboard(self.frame, draw, spec.input_text, layout, spec.highlight_key)
+                PROFILER.lap('keyboard')
+            self.partial += 1
+        self._base, self._history = base, spec.history
+        self._dots = dots
+        return self.frame
+
+class FrameTimeline:
+    """Plays compiled segments (see ``compile_segment``) into a writer.
+
+    Held frames were already merged by the compiler, so each entry is
+    rendered exactly once and the writer is responsible for repeating it for
+    its duration. Frames are drawn by a ``FrameRenderer`` into one reused
+    buffer, so writers must not keep the image after ``write``.
+    """
+
+    def __init__(self, writer, renderer=None):
+        self.writer = writer
+        self.renderer = renderer or FrameRenderer()
+        self.scheduled = 0
+        self.unique = 0
+
+    def play(self, compiled):
+        entries, scheduled = compiled
+        for _, spec, duration in entries:
+            self.writer.write(self.renderer.render(spec), duration)
+        self.unique += len(entries)
+        self.scheduled += scheduled
+
+def _encoder_args(codec, preset, ffmpeg_params, pix_fmt, size, mux_params=None):
+    """ffmpeg output options shared by the ffmpeg-driven writers."""
+    args = ['-vcodec', codec]
+    if preset:
+        args += ['-preset', preset]
+    args += list(ffmpeg_params or [])
+    width, height = size
+    if pix_fmt and width % 2 == 0 and height % 2 == 0:
+        args += ['-pix_fmt', pix_fmt]
+    return args + list(mux_params or [])
+
+RAW_WRITE_BUFSIZE = 1 << 18
+
+def write_raw_frame(img, fd):
+    """Write ``img`` as packed raw pixels straight to file descriptor ``fd``.
+
+    Pillow's raw encoder packs rows into its own small buffer and writes them
+    from C, so no frame-sized bytes object is built. Returns False when this
+    Pillow is not one the private encoder API is known to work with (see
+    ``PILLOW_PRIVATE_API_VERSIONS``), in which case nothing was written.
+    """
+    if not pillow_private_api():
+        return False
+    try:
+        encoder = Image._getencoder(img.mode, "raw", img.mode)
+        encoder.setimage(img.im)
+        encode_to_file = encoder.encode_to_file
+    except AttributeError:
+        return False
+    status = encode_to_file(fd, RAW_WRITE_BUFSIZE)
+    if status < 0:
+        raise IOError(f"raw encoder error {status}")
+    return True
+
+class ConstantRateWriter:
+    """Base for writers that repeat each frame for ``round(duration * fps)`` output frames.
+
+    Subclasses implement ``_emit(img, repeats)`` and ``_finish()``. Time spent
+    inside them is reported as ``encode_seconds``.
+    """
+
+    def __init__(self, path, fps):
+        self.path = path
+        self.fps = fps
+        self.frames_written = 0
+        self.encode_seconds = 0.0
+        self._elapsed = 0.0
+
+    @property
+    def duration(self):
+        return self.frames_written / self.fps
+
+    def write(self, img, duration):
+        """Hold ``img`` on screen for ``duration`` seconds."""
+        self._elapsed += duration
+        # Round against the running total so per-frame rounding never drifts
+        target = int(round(self._elapsed * self.fps))
+        repeats = target - self.frames_written
+        if repeats <= 0:
+            return
+        started = time.perf_counter()
+        self._emit(img, repeats)
+        self.encode_seconds += time.perf_counter() - started
+        self.frames_written = target
+
+    def close(self):
+        started = time.perf_counter()
+        with PROFILER.stage('encode'):
+            self._finish()
+        self.encode_seconds += time.perf_counter() - started
+
+    def abort(self):
+        """Stop without finishing the output (used when rendering fails)."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+class FrameWriter(ConstantRateWriter):
+    """Stream frames straight into an ffmpeg process at a constant frame rate.
+
+    Each frame is written as raw RGB bytes together with how long it stays on
+    screen, then dropped, so memory use does not grow with the story length.
+    Pixels are streamed from the image into the pipe (``write_raw_frame``);
+    without that Pillow API a held frame is converted with ``tobytes`` once and
+    the same bytes are written again for each repeat.
+    """
+
+    def __init__(self, path, size, fps=24, codec='libx264', preset='ultrafast', ffmpeg_params=None,
+                 pix_fmt='yuv420p', mux_params=None):
+        super().__init__(path, fps)
+        width, height = size
+        cmd = [
+            imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-vcodec', 'rawvideo',
+            '-s', f'{width}x{height}', '-pix_fmt', 'rgb24', '-r', str(fps),
+            '-i', '-', '-an',
+        ]
+        cmd += _encoder_args(codec, preset, ffmpeg_params, pix_fmt, size, mux_params)
+        cmd.append(path)
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        self._fd = self._proc.stdin.fileno()
+        self._direct = True  # Cleared if Pillow cannot write to the fd itself
+
+    def _emit(self, img, repeats):
+        try:
+            if self._direct:
+                # Pixels go from Pillow's image memory into the pipe; conversion and
+                # pipe time cannot be told apart here, so both count as encoding
+                with PROFILER.stage('encode'):
+                    for _ in range(repeats):
+                        if not write_raw_frame(img, self._fd):
+                            self._direct = False
+                            break
+                    else:
+                        return
+            with PROFILER.stage('convert'):
+                data = img.tobytes()
+            with PROFILER.stage('encode'):
+                for _ in range(repeats):
+                    self._proc.stdin.write(data)
+        except BrokenPipeError:
+            self._proc.wait()
+            raise IOError(f"ffmpeg exited early (code {self._proc.returncode}) while writing {self.path}")
+
+    def _finish(self):
+        if self._proc.stdin and not self._proc.stdin.closed:
+            self._proc.stdin.close()
+        if self._proc.wait() != 0:
+            raise IOError(f"ffmpeg failed with code {self._proc.returncode} while writing {self.path}")
+
+    def abort(self):
+        self._proc.kill()
+        self._proc.wait()
+
+class MoviePyWriter(ConstantRateWriter):
+    """Constant-frame-rate output through MoviePy's ``FFMPEG_VideoWriter`` (needs moviepy)."""
+
+    def __init__(self, path, size, fps=24, codec='libx264', preset='ultrafast', ffmpeg_params=None,
+                 pix_fmt='yuv420p', mux_params=None):
+        # MoviePy appends its own -pix_fmt yuv420p for libx264 at even sizes, after
+        # ffmpeg_params, so any other pixel format would be silently replaced
+        if pix_fmt and pix_fmt != 'yuv420p':
+            raise ValueError(f"the moviepy encoder only writes yuv420p; use --encoder pipe for {pix_fmt} output")
+        from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+        super().__init__(path, fps)
+        self._writer = FFMPEG_VideoWriter(path, size, fps, codec=codec, preset=preset or 'medium',
+                                          ffmpeg_params=list(ffmpeg_params or []) + list(mux_params or []))
+
+    def _emit(self, img, repeats):
+        with PROFILER.stage('convert'):
+            frame = np.asarray(img)
+        with PROFILER.stage('encode'):
+            for _ in range(repeats):
+                self._writer.write_frame(frame)
+
+    def _finish(self):
+        self._writer.close()
+
+    def abort(self):
+        self._writer.close()
+
+class PngSequenceWriter(ConstantRateWriter):
+    """Numbered PNG frames at a constant frame rate, for editing or encoding elsewhere.
+
+    Frames go into a directory named after the output file (without its
+    extension). Repeats of a held frame are hard links to the first copy, so
+    they cost no extra disk space where the filesystem allows it. Encoder
+    profile settings do not apply.
+    """
+
+    def __init__(self, path, size, fps=24, **profile):
+        super().__init__(os.path.splitext(path)[0], fps)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _emit(self, img, repeats):
+        first = os.path.join(self.path, f"{self.frames_written:06d}.png")
+        with PROFILER.stage('convert'):
+            img.save(first, compress_level=1)
+        for n in range(self.frames_written + 1, self.frames_written + repeats):
+            frame = os.path.join(self.path, f"{n:06d}.png")
+            try:
+                os.link(first, frame)
+            except OSError:
+                shutil.copyfile(first, frame)
+
+    def _finish(self):
+        pass
+
+class FrameCounter(ConstantRateWriter):
+    """Counts the output frames a constant-rate writer would emit, without drawing or encoding."""
+
+    def __init__(self, fps=24):
+        super().__init__(None, fps)
+
+    def _emit(self, img, repeats):
+        pass
+
+    def _finish(self):
+        pass
+
+class ConcatWriter:
+    """Variable-frame-rate output: every unique frame is encoded once with its duration.
+
+    Frames are saved as PNGs in a temporary directory next to an ffconcat list
+    of per-image durations; ``close`` encodes them with ffmpeg's concat
+    demuxer. Held frames cost one image rather than ``duration * fps`` copies,
+    which keeps the encoded file smaller.
+    """
+
+    def __init__(self, path, size, fps=24, codec='libx264', preset='ultrafast', ffmpeg_params=None,
+                 pix_fmt='yuv420p', mux_params=None):
+        self.path = path
+        self.fps = fps
+        self.encoder_args = _encoder_args(codec, preset, ffmpeg_params, pix_fmt, size, mux_params)
+        self.frames_written = 0
+        self.duration = 0.0
+        self.encode_seconds = 0.0
+        self._tmpdir = tempfile.mkdtemp(prefix='story-frames-')
+        self._entries = []
+
+    def write(self, img, duration):
+        started = time.perf_counter()
+        name = f"{self.frames_written:06d}.png"
+        with PROFILER.stage('convert'):
+            img.save(os.path.join(self._tmpdir, name), compress_level=1)
+        self._entries.append((name, duration))
+        self.frames_written += 1
+        self.duration += duration
+        self.encode_seconds += time.perf_counter() - started
+
+    def close(self):
+        started = time.perf_counter()
+        try:
+            if not self._entries:
+                raise IOError(f"no frames were written for {self.path}")
+            list_path = os.path.join(self._tmpdir, 'frames.ffconcat')
+            with open(list_path, 'w', encoding='utf-8') as f:
+                f.write('ffconcat version 1.0\n')
+                for name, duration in self._entries:
+                    f.write(f"file '{name}'\nduration {duration:.6f}\n")
+                # The concat demuxer drops the last duration unless the file is repeated
+                f.write(f"file '{self._entries[-1][0]}'\n")
+            cmd = [
+                imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+                '-f', 'concat', '-safe', '0', '-i', list_path, '-an', '-vsync', 'vfr',
+            ]
+            cmd += self.encoder_args
+            cmd.append(self.path)
+            with PROFILER.stage('encode'):
+                returncode = subprocess.run(cmd).returncode
+            if returncode != 0:
+                raise IOError(f"ffmpeg failed while writing {self.path}")
+        finally:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self.encode_seconds += time.perf_counter() - started
+
+# Output backends selectable with --encoder; every one takes
+# (path, size, fps, **profile) and offers write(img, duration) / close()
+WRITER_BACKENDS = {
+    "pipe": FrameWriter,
+    "vfr": ConcatWriter,
+    "moviepy": MoviePyWriter,
+    "png": PngSequenceWriter,
+}
+
+# Named encoder settings selectable with --encoder-profile. Parallel segments
+# are encoded with the same profile so they can be joined without re-encoding.
+ENCODER_PROFILES = {
+    # Fastest turnaround; lower quality
+    "draft": {
+        "codec": 'libx264',
+        "preset": 'ultrafast',
+        "ffmpeg_params": ['-crf', '28'],
+    },
+    # Upload-ready: flat UI frames suit the animation tune and long keyframe intervals
+    "social": {
+        "codec": 'libx264',
+        "preset": 'veryfast',
+        "ffmpeg_params": ['-crf', '23', '-tune', 'animation', '-g', '240'],
+        # Container options go in mux_params so joined segment renders keep them too
+        "mux_params": ['-movflags', '+faststart'],
+    },
+    # Lossless master (full chroma) for re-encoding elsewhere
+    "archive": {
+        "codec": 'libx264',
+        "preset": 'veryfast',
+        "ffmpeg_params": ['-qp', '0'],
+        "pix_fmt": 'yuv444p',
+    },
+    # VP9 for .webm output
+    "webm": {
+        "codec": 'libvpx-vp9',
+        "preset": None,
+        "ffmpeg_params": ['-crf', '34', '-b:v', '0', '-deadline', 'realtime', '-cpu-used', '8', '-row-mt', '1'],
+    },
+}
+DEFAULT_ENCODER_PROFILE = "draft"
+
+def output_bytes(path):
+    """Size of a rendered file, or of all files in a frame-sequence directory."""
+    if os.path.isdir(path):
+        # Hard-linked repeats share an inode and are counted once
+        sizes = {entry.inode(): entry.stat().st_size for entry in os.scandir(path) if entry.is_file()}
+        return sum(sizes.values())
+    return os.path.getsize(path)
+
+def plan_story(dialogue, me, chat_type, contact=None, group_title=None, show_names=False):
+    """Layout pre-pass: give every message its chat, y and height without rendering.
+
+    Returns one segment per message. ``seg["history"][:seg["count"]]`` is what
+    the chat shows before the message and ``seg["history"][seg["count"]]`` is
+    the message itself, so each segment can be rendered on its own. Direct
+    chats keep one history per peer and switch chats when a different peer
+    writes; ``seg["open_chats"]`` lists the chat views shown before the message.
+    """
+    chats = {}
+    plan = []
+    current = contact if chat_type == 'direct' else group_title
+    # Direct chats open on the contact's thread before the first message
+    opens = [current] if chat_type == 'direct' else []
+    for i, (name, text) in enumerate(dialogue):
+        name = sys.intern(name)  # One copy of each sender name however long the chat
+        side = 'right' if name == me else 'left'
+        if chat_type == 'direct' and side == 'left' and name != current:
+            current = name
+            opens.append(current)
+        open_chats = []
+        for title in opens:
+            opened = chats.setdefault(title, {"history": ChatHistory(), "y": CHAT_TOP_Y + TOP_PADDING + px(40)})
+            open_chats.append({"title": title, "history": opened["history"], "count": len(opened["history"])})
+        opens = []
+        chat = chats.setdefault(current, {"history": ChatHistory(), "y": CHAT_TOP_Y + TOP_PADDING + px(40)})
+        history = chat["history"]
+        _, bubble_h, _ = bubble_size(None, text, WIDTH - px(100))
+        plan.append({
+            "index": i,
+            "name": name,
+            "text": text,
+            "side": side,
+            "chat": current,
+            "title": current,
+            "history": history,
+            "count": len(history),
+            "y": chat["y"],
+            "open_chats": open_chats,
+        })
+        # 1:1 chats never show a left-side name label
+        history.append(HistoryEntry(name if (side == 'left' and show_names) else None, text, side, chat["y"], bubble_h))
+        chat["y"] += bubble_h + px(24)
+    return plan
+
+def segment_frames(seg, canvas=None):
+    """Frames for one planned message: chat switches, typing animation, settled bubble.
+
+    Yields ``(kind, FrameSpec, duration)`` with kind ``open``, ``keyboard``,
+    ``dots`` or ``settle``.
+    """
+    history, count, title = seg["history"], seg["count"], seg["title"]
+    before = history[:count]
+    for opened in seg["open_chats"]:
+        # Show current chat view (with existing history) to simulate switching
+        opened_canvas = canvas if opened["title"] == seg["chat"] else None
+        yield 'open', FrameSpec(opened["history"][:opened["count"]], title=opened["title"], canvas=opened_canvas), 0.3
+    if seg["side"] == 'right':
+        kind, frames = 'keyboard', typing_keyboard(seg["text"], title=title, history=before, canvas=canvas)
+    else:
+        kind, frames = 'dots', typing_indicator(seg["name"], y_offset=seg["y"], title=title, history=before,
+                                                canvas=canvas)
+    for spec, duration in frames:
+        yield kind, spec, duration
+    yield 'settle', FrameSpec(history[:count + 1], title=title, canvas=canvas), 0.8  # Shorter duration
+
+def compile_segment(seg, canvas=None):
+    """Compile one planned message into the frames the renderer draws, without drawing them.
+
+    Returns ``(entries, scheduled)``. ``entries`` is a list of ``[kind, spec,
+    duration]`` in which consecutive frames with the same ``FrameSpec.key()``
+    are merged into one held frame (a typed message ending in punctuation,
+    for example), so every entry is rendered exactly once. ``scheduled``
+    counts the frames before merging. ``FrameTimeline.play`` renders these
+    entries and ``dry_run`` only counts them.
+    """
+    entries = []
+    scheduled = 0
+    last_key = None
+    for kind, spec, duration in segment_frames(seg, canvas):
+        scheduled += 1
+        key = spec.key()
+        if entries and key == last_key:
+            entries[-1][2] += duration
+            continue
+        entries.append([kind, spec, duration])
+        last_key = key
+    return entries, scheduled
+
+def concat_segments(paths, output, mux_params=None):
+    """Join encoded segments with ffmpeg's concat demuxer, without re-encoding.
+
+    ``mux_params`` are the profile's container options (faststart, ...),
+    which a stream copy would otherwise drop.
+    """
+    list_fd, list_path = tempfile.mkstemp(suffix='.ffconcat', prefix='story-segments-')
+    try:
+        with os.fdopen(list_fd, 'w', encoding='utf-8') as f:
+            f.write('ffconcat version 1.0\n')
+            for path in paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        cmd = [imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+               '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', *(mux_params or []), output]
+        if subprocess.run(cmd).returncode != 0:
+            raise IOError(f"ffmpeg failed while joining segments into {output}")
+    finally:
+        os.remove(list_path)
+
+def _ensure_layout(size):
+    """Worker initializer: match the parent's frame size (spawned workers start at the design size)."""
+    if tuple(size) != (WIDTH, HEIGHT):
+        configure_layout(Layout(*size))
+
+# Per-process state for segment workers (set by _init_segment_worker)
+_SEGMENT_WORKER = {}
+
+def _init_segment_worker(plan, options, isolated=True):
+    """Prepare segment rendering; ``isolated`` workers report their own profile snapshot."""
+    _ensure_layout(options["size"])
+    PROFILER.enabled = options["timings"]
+    _SEGMENT_WORKER.update(plan=plan, options=options, canvases={}, isolated=isolated)
+
+def _render_segment_job(task):
+    """Render and encode one planned segment to its own file ``(index, path)``."""
+    index, path = task
+    plan, options = _SEGMENT_WORKER["plan"], _SEGMENT_WORKER["options"]
+    seg = plan[index]
+    canvas = None
+    if options["scroll_buffer"]:
+        canvas = _SEGMENT_WORKER["canvases"].setdefault(seg["chat"], ChatCanvas())
+    writer_cls = WRITER_BACKENDS[options["backend"]]
+    isolated = _SEGMENT_WORKER["isolated"]
+    if isolated:
+        PROFILER.reset()
+    PROFILER.current = index
+    writer = writer_cls(path, (WIDTH, HEIGHT), fps=options["fps"], **ENCODER_PROFILES[options["profile"]])
+    timeline = FrameTimeline(writer)
+    timeline.play(compile_segment(seg, canvas))
+    PROFILER.current = None
+    writer.close()
+    return (writer.path, writer.frames_written, timeline.unique, timeline.scheduled,
+            writer.encode_seconds, writer.duration), PROFILER.snapshot() if isolated else None
+
+def _segment_options(output, fps, backend, profile, scroll_buffer):
+    return {
+        "size": (WIDTH, HEIGHT),
+        "fps": fps,
+        "backend": backend,
+        "profile": profile,
+        "scroll_buffer": scroll_buffer,
+        "timings": PROFILER.enabled,
+        "ext": os.path.splitext(output)[1] or '.mp4',
+    }
+
+def _render_segment_files(plan, tasks, workers, options):
+    """Render ``(index, path)`` tasks in order, in a pool when ``workers > 1``; yields per-segment results."""
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_segment_worker, initargs=(plan, options)) as pool:
+            for result, timings in pool.imap(_render_segment_job, tasks):
+                PROFILER.merge(timings)
+                yield result
+    else:
+        _init_segment_worker(plan, options, isolated=False)
+        for task in tasks:
+            yield _render_segment_job(task)[0]
+
+def render_segments_parallel(plan, output, workers, fps=24, backend='pipe', profile=DEFAULT_ENCODER_PROFILE,
+                             scroll_buffer=False, log=print, progress=None):
+    """Render planned segments across a process pool and join them in order.
+
+    Returns ``(frames, unique_frames, scheduled_frames, encode_seconds, duration)``
+    totals; ``encode_seconds`` includes the final join.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='story-segments-')
+    options = _segment_options(output, fps, backend, profile, scroll_buffer)
+    tasks = [(i, os.path.join(tmpdir, f"segment-{i:05d}{options['ext']}")) for i in range(len(plan))]
+    totals = [0, 0, 0, 0.0, 0.0]
+    paths = []
+    try:
+        for done, (path, *counts) in enumerate(_render_segment_files(plan, tasks, workers, options), 1):
+            paths.append(path)
+            totals = [t + c for t, c in zip(totals, counts)]
+            log(f"  Segment {done}/{len(plan)} done")
+            if progress:
+                progress(done, len(plan))
+        log(f"Joining {len(paths)} segments into {output}...")
+        started = time.perf_counter()
+        with PROFILER.stage('concat'):
+            concat_segments(paths, output, ENCODER_PROFILES[profile].get('mux_params'))
+        totals[3] += time.perf_counter() - started
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return tuple(totals)
+
+class SegmentCache:
+    """Encoded message segments on disk, keyed by a hash of everything that shapes their pixels.
+
+    Each entry is the segment file plus a ``.json`` sidecar with its frame
+    counts. Hits refresh the file's mtime and ``evict`` drops the least
+    recently used entries until the cache fits ``max_bytes``.
+    """
+
+    def __init__(self, directory=SEGMENT_CACHE_DIR, max_bytes=SEGMENT_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _paths(self, key, ext):
+        base = os.path.join(self.directory, key[:2], key)
+        return base + ext, base + '.json'
+
+    def contains(self, key, ext):
+        """Whether a segment is cached, without counting or refreshing it."""
+        return os.path.exists(self._paths(key, ext)[1])
+
+    def get(self, key, ext):
+        """``(path, meta)`` for a cached segment, or None."""
+        path, meta_path = self._paths(key, ext)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path, meta
+
+    def put(self, key, ext, source, meta):
+        """Move a freshly encoded segment into the cache; returns ``(path, meta)``."""
+        path, meta_path = self._paths(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source, path)
+        # Sidecar last, atomically: an entry counts as present only once both exist
+        tmp = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+        return path, meta
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits; returns the bytes freed."""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(('.json', '.tmp')):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        freed = 0
+        for _, size, path in sorted(entries):
+            if total - freed <= self.max_bytes:
+                break
+            for victim in (os.path.splitext(path)[0] + '.json', path):
+                try:
+                    os.remove(victim)
+                except FileNotFoundError:
+                    pass
+            freed += size
+        return freed
+
+def _font_key(font):
+    path = getattr(font, 'path', None)
+    if not isinstance(path, str):
+        return [type(font).__name__, getattr(font, 'size', None)]
+    try:
+        st = os.stat(path)
+        stamp = [st.st_size, int(st.st_mtime)]
+    except OSError:
+        stamp = None
+    return [path, font.size, stamp]
+
+def segment_cache_keys(plan, fps, backend, profile, scroll_buffer):
+    """Content hash per planned segment.
+
+    Covers the renderer version, frame size, fonts, phone chrome, encoder
+    settings, the message itself, the chat views opened before it and the
+    layout of its chat's history up to and including the message's own
+    entry (its name label depends on the whole cast). History is hashed as a running digest per
+    chat, so every message costs one step however long the chat gets. The
+    status bar clock is included, so call ``pin_phone_state`` first to keep
+    it from changing between runs.
+    """
+    sprites = emoji_sprites()
+    settings = json.dumps({
+        "version": RENDERER_VERSION,
+        "size": [WIDTH, HEIGHT, SCALE],
+        "fonts": [_font_key(f) for f in (FONT, SMALL_FONT, TIME_FONT, HEADER_FONT)],
+        "battery": BATTERY_LEVEL,
+        "clock": CLOCK_TIME,
+        "network": NETWORK_TYPE,
+        "emoji": sprites.source.name if sprites else None,
+        "fps": fps,
+        "backend": backend,
+        "encoder": ENCODER_PROFILES[profile],
+        "scroll_buffer": bool(scroll_buffer),
+    }, sort_keys=True)
+    prefixes = {}  # id(history) -> running digests of history[:k] for k = 0..n
+
+    def history_digest(history, count):
+        digests = prefixes.setdefault(id(history), [hashlib.sha256(settings.encode()).hexdigest()])
+        while len(digests) <= count:
+            entry = history[len(digests) - 1]
+            step = json.dumps([digests[-1], entry.name, entry.text, entry.side, entry.y, entry.height])
+            digests.append(hashlib.sha256(step.encode()).hexdigest())
+        return digests[count]
+
+    keys = []
+    for seg in plan:
+        content = json.dumps({
+            "history": history_digest(seg["history"], seg["count"] + 1),
+            "message": [seg["name"], seg["text"], seg["side"], seg["title"], seg["y"]],
+            "open_chats": [[o["title"], history_digest(o["history"], o["count"])] for o in seg["open_chats"]],
+        }, sort_keys=True)
+        keys.append(hashlib.sha256(content.encode()).hexdigest())
+    return keys
+
+def _story_seed(story):
+    return json.dumps([story["me"], story["chat_type"], story["contact"], story["group_title"]])
+
+def story_battery_level(story):
+    """Battery level derived from the story's cast, so reruns reuse cached segments."""
+    return random.Random(_story_seed(story)).randint(15, 100)
+
+def story_clock_time(story):
+    """Status bar time derived from the story's cast, so reruns reuse cached segments."""
+    rng = random.Random(_story_seed(story) + ':clock')
+    return f"{rng.randint(1, 12)}:{rng.randint(0, 59):02d}"
+
+def pin_phone_state(story):
+    """Fix the battery level and clock for ``story`` so fresh and cached segments agree."""
+    global BATTERY_LEVEL, CLOCK_TIME
+    BATTERY_LEVEL = story_battery_level(story)
+    CLOCK_TIME = story_clock_time(story)
+
+def render_segments_cached(plan, output, cache, workers=1, fps=24, backend='pipe', profile=DEFAULT_ENCODER_PROFILE,
+                           scroll_buffer=False, log=print, progress=None):
+    """Reuse cached segments, render only the ones that changed and join them without re-encoding.
+
+    Returns the same totals as ``render_segments_parallel``; reused segments
+    count their frames but no encode time.
+    """
+    options = _segment_options(output, fps, backend, profile, scroll_buffer)
+    ext = options["ext"]
+    keys = segment_cache_keys(plan, fps, backend, profile, scroll_buffer)
+    entries = [cache.get(key, ext) for key in keys]
+    missing = [i for i, entry in enumerate(entries) if entry is None]
+    log(f"Segment cache: reusing {len(plan) - len(missing)}/{len(plan)} segments, rendering {len(missing)}")
+    if progress:
+        progress(len(plan) - len(missing), len(plan))
+    os.makedirs(cache.directory, exist_ok=True)
+    # Render inside the cache directory so finished segments move in with a rename
+    tmpdir = tempfile.mkdtemp(prefix='tmp-', dir=cache.directory)
+    tasks = [(i, os.path.join(tmpdir, f"segment-{i:05d}{ext}")) for i in missing]
+    encode_seconds = 0.0
+    try:
+        results = _render_segment_files(plan, tasks, max(1, min(workers, len(tasks))), options)
+        for done, ((index, _), (path, frames, unique, scheduled, seconds, duration)) in enumerate(
+                zip(tasks, results), 1):
+            meta = {"frames": frames, "unique": unique, "scheduled": scheduled, "duration": duration}
+            entries[index] = cache.put(keys[index], ext, path, meta)
+            encode_seconds += seconds
+            log(f"  Segment {index + 1}/{len(plan)} rendered ({done}/{len(tasks)})")
+            if progress:
+                progress(len(plan) - len(tasks) + done, len(plan))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    log(f"Joining {len(entries)} segments into {output}...")
+    started = time.perf_counter()
+    with PROFILER.stage('concat'):
+        concat_segments([path for path, _ in entries], output, ENCODER_PROFILES[profile].get('mux_params'))
+    encode_seconds += time.perf_counter() - started
+    freed = cache.evict()
+    if freed:
+        log(f"Segment cache: evicted {freed / 1e6:.1f} MB of least recently used segments")
+    metas = [meta for _, meta in entries]
+    return (sum(m["frames"] for m in metas), sum(m["unique"] for m in metas), sum(m["scheduled"] for m in metas),
+            encode_seconds, sum(m["duration"] for m in metas))
+
+def resolve_story(script, me=None, title=None, chat_type=None, contact=None):
+    """Work out who "me" is, the chat type, contact and title for a loaded script.
+
+    ``script`` is the tuple returned by ``load_script``; the keyword arguments
+    are CLI-style overrides that win over the script's own values.
+    """
+    script_me, script_title, dialogue, script_type, script_contact = script
     # Resolve ME_NAME priority: CLI > script > default
-    if args.me:
-        ME_NAME = args.me
-    elif script_me:
-        ME_NAME = script_me
-    print(f"Your name (blue bubbles): {ME_NAME}")
+    me = me or script_me or ME_NAME
 
     # Determine conversation type and primary contact (for direct)
-    chat_type = args.type or script_type
+    chat_type = chat_type or script_type
     # Infer type if not provided
     if not chat_type:
-        participants = list(dict.fromkeys([n for n, _ in dialogue if n != ME_NAME]))
-        chat_type = 'direct' if len(participants) <= 1 else 'group'
+        others = list(dict.fromkeys([n for n, _ in dialogue if n != me]))
+        chat_type = 'direct' if len(others) <= 1 else 'group'
 
-    contact = args.contact or script_contact
+    contact = contact or script_contact
+    participants = list(dict.fromkeys([n for n, _ in dialogue]))
     if chat_type == 'direct':
         # Infer contact if missing: first non-me sender in the script
         if not contact:
             for n, _ in dialogue:
-                if n != ME_NAME:
+                if n != me:
                     contact = n
                     break
         if not contact:
             raise ValueError('For type=direct, could not infer contact (no non-me sender found). Provide --contact or set "contact" in script.')
         group_title = None
-        print(f"Chat type: Direct conversation with {contact}")
     else:
         # Group chat title
-        participants = list(dict.fromkeys([n for n, _ in dialogue]))
-        group_title = args.title or script_title or compute_group_title(participants)
-        print(f"Chat type: Group conversation - {group_title}")
-        print(f"Participants: {', '.join(participants)}")
-
-    clips = []
-    # Per-chat state for direct conversations
-    chat_states = {}
-    history = []
-    y_offset = CHAT_TOP_Y + TOP_PADDING + 40
-
-    def open_chat(title, history):
-        # Show current chat view (with existing history) to simulate switching
-        frame = render_chat_frame(history, title=title)
-        clips.append(ImageClip(np.array(frame)).set_duration(0.3))  # Shorter duration
+        group_title = title or script_title or compute_group_title(participants, me)
+    return {
+        "me": me,
+        "dialogue": dialogue,
+        "chat_type": chat_type,
+        "contact": contact,
+        "group_title": group_title,
+        "participants": participants,
+        # Group chats show names on the left if >2 participants
+        "show_names": chat_type != 'direct' and len(participants) > 2,
+    }
 
-    # Pre-calculate bubble sizes to avoid redundant calculations
-    print("Pre-calculating bubble sizes...")
-    bubble_cache = {}
-    
-    if chat_type == 'direct':
-        current_peer = contact
-        # initialize state for the first peer if not exists
-        if current_peer not in chat_states:
-            chat_states[current_peer] = {"history": [], "y": CHAT_TOP_Y + TOP_PADDING + 40}
-        history = chat_states[current_peer]["history"]
-        y_offset = chat_states[current_peer]["y"]
-        print(f"Opening chat with {current_peer}")
-        open_chat(current_peer, history)
-        
-        for i, (name, text) in enumerate(dialogue, 1):
-            print(f"Processing message {i}/{len(dialogue)}: {name[:10]}...")
-            
-            # Determine target peer for this message
-            if name == ME_NAME:
-                target_peer = current_peer
-                side = 'right'
-            else:
-                target_peer = name
-                side = 'left'
-
-            # Switch chats if needed
-            if target_peer != current_peer:
-                print(f"Switching to chat with {target_peer}")
-                current_peer = target_peer
-                if current_peer not in chat_states:
-                    chat_states[current_peer] = {"history": [], "y": CHAT_TOP_Y + TOP_PADDING + 40}
-                history = chat_states[current_peer]["history"]
-                y_offset = chat_states[current_peer]["y"]
-                open_chat(current_peer, history)
-
-            # Typing animation
-            if side == 'right':
-                print(f"  Rendering keyboard typing animation...")
-                clips.append(typing_keyboard(text, title=current_peer, history=history))
-            else:
-                print(f"  Rendering typing dots animation...")
-                clips.append(typing_indicator(name, y_offset=y_offset, title=current_peer, history=history))
-
-            # Calculate bubble size once
-            if text not in bubble_cache:
-                tmp_img = Image.new("RGB", (WIDTH, HEIGHT), CHAT_BG)
-                tmp_draw = ImageDraw.Draw(tmp_img)
-                bubble_w, bubble_h, _ = bubble_size(tmp_draw, text, WIDTH - 100)
-                bubble_cache[text] = (bubble_w, bubble_h)
-            else:
-                bubble_w, bubble_h = bubble_cache[text]
-
-            history.append({
-                "name": None,  # 1:1 chat: no left-side name label
-                "text": text,
-                "side": side,
-                "y": y_offset,
-                "height": bubble_h  # Cache height for performance
-            })
-            print(f"  Rendering message frame...")
-            frame_img = render_chat_frame(history, title=current_peer)
-            clips.append(ImageClip(np.array(frame_img)).set_duration(0.8))  # Shorter duration
-            y_offset += bubble_h + 24
-            # persist updated y for this chat
-            chat_states[current_peer]["y"] = y_offset
+def checked_story(script, me=None, title=None, chat_type=None, contact=None):
+    """``resolve_story`` plus the checks a render needs; raises ValueError for a story that cannot render."""
+    if chat_type not in (None, 'direct', 'group'):
+        raise ValueError('type must be "direct" or "group"')
+    story = resolve_story(script, me=me, title=title, chat_type=chat_type, contact=contact)
+    if not len(story["dialogue"]):
+        raise ValueError('Script has no messages')
+    return story
+
+def validate_script(path, me=None, title=None, chat_type=None, contact=None):
+    """Load and resolve a script exactly as a render would, without rendering.
+
+    Returns the resolved story; raises ValueError or OSError for a script
+    that would fail to render.
+    """
+    return checked_story(load_script(path), me=me, title=title, chat_type=chat_type, contact=contact)
+
+def render_story(story, output, fps=24, workers=1, backend='pipe', profile=DEFAULT_ENCODER_PROFILE,
+                 scroll_buffer=False, cache=None, log=print, progress=None):
+    """Render a resolved story to ``output``; returns a summary dict.
+
+    ``backend`` names a ``WRITER_BACKENDS`` entry and ``profile`` an
+    ``ENCODER_PROFILES`` entry. With a ``SegmentCache`` the story is rendered
+    per message and unchanged messages are reused from the cache.
+    ``progress(done, total)`` is called as messages finish.
+    """
+    started = time.perf_counter()
+    log(f"Your name (blue bubbles): {story['me']}")
+    if story["chat_type"] == 'direct':
+        log(f"Chat type: Direct conversation with {story['contact']}")
     else:
-        # Group chat — single room, show names on left if >2 participants
-        show_names = True if len(participants) > 2 else False
-        print(f"Starting group chat rendering (show names: {show_names})")
-        
-        for i, (name, text) in enumerate(dialogue, 1):
-            print(f"Processing message {i}/{len(dialogue)}: {name[:10]}...")
-            
-            side = 'right' if name == ME_NAME else 'left'
-            if side == 'right':
-                print(f"  Rendering keyboard typing animation...")
-                clips.append(typing_keyboard(text, title=group_title, history=history))
-            else:
-                print(f"  Rendering typing dots animation...")
-                clips.append(typing_indicator(name, y_offset=y_offset, title=group_title, history=history))
-
-            # Calculate bubble size once
-            if text not in bubble_cache:
-                tmp_img = Image.new("RGB", (WIDTH, HEIGHT), CHAT_BG)
-                tmp_draw = ImageDraw.Draw(tmp_img)
-                bubble_w, bubble_h, _ = bubble_size(tmp_draw, text, WIDTH - 100)
-                bubble_cache[text] = (bubble_w, bubble_h)
-            else:
-                bubble_w, bubble_h = bubble_cache[text]
-
-            history.append({
-                "name": (name if (side == 'left' and show_names) else None),
-                "text": text,
-                "side": side,
-                "y": y_offset,
-                "height": bubble_h  # Cache height for performance
-            })
-            print(f"  Rendering message frame...")
-            frame_img = render_chat_frame(history, title=group_title)
-            clips.append(ImageClip(np.array(frame_img)).set_duration(0.8))  # Shorter duration
-            y_offset += bubble_h + 24
-
-    # Render final video with lower quality for speed
-    print(f"\nCombining {len(clips)} video clips...")
-    final = concatenate_videoclips(clips, method="compose")
-    
-    print(f"Encoding video to {args.output}...")
-    print("This may take a moment depending on video length...")
-    final.write_videofile(args.output, fps=args.fps, 
-                         codec='libx264', 
-                         preset='ultrafast',  # Fastest encoding
-                         ffmpeg_params=['-crf', '28'])  # Lower quality for speed
-    print(f"✅ Video generated successfully -> {args.output}")
+        log(f"Chat type: Group conversation - {story['group_title']}")
+        log(f"Participants: {', '.join(story['participants'])}")
+
+    log("Planning message layout...")
+    with PROFILER.stage('plan'):
+        plan = plan_story(story["dialogue"], story["me"], story["chat_type"], contact=story["contact"],
+                          group_title=story["group_title"], show_names=story["show_names"])
+    PROFILER.labels.update((seg["index"], seg["name"]) for seg in plan)
+    if story["chat_type"] != 'direct':
+        log(f"Starting group chat rendering (show names: {story['show_names']})")
+
+    writer_cls = WRITER_BACKENDS[backend]
+    workers = max(1, min(workers, len(plan)))
+    if backend == 'png':
+        if workers > 1:
+            log("PNG sequences are written by a single process; ignoring --workers")
+        workers, cache = 1, None
+    if cache is not None:
+        frames, unique, scheduled, encode_seconds, duration = render_segments_cached(
+            plan, output, cache, workers, fps=fps, backend=backend, profile=profile, scroll_buffer=scroll_buffer,
+            log=log, progress=progress)
+    elif workers > 1:
+        log(f"Rendering {len(plan)} message segments with {workers} workers...")
+        frames, unique, scheduled, encode_seconds, duration = render_segments_parallel(
+            plan, output, workers, fps=fps, backend=backend, profile=profile, scroll_buffer=scroll_buffer, log=log,
+            progress=progress)
+    else:
+        log(f"Encoding video to {output} (frames are streamed to ffmpeg)...")
+        writer = writer_cls(output, (WIDTH, HEIGHT), fps=fps, **ENCODER_PROFILES[profile])
+        timeline = FrameTimeline(writer)
+        canvases = {}  # Scroll-buffer mode keeps one tall canvas per chat
+        for seg in plan:
+            for opened in seg["open_chats"]:
+                verb = "Opening chat" if seg["index"] == 0 and opened is seg["open_chats"][0] else "Switching to chat"
+                log(f"{verb} with {opened['title']}")
+            log(f"Processing message {seg['index'] + 1}/{len(plan)}: {seg['name'][:10]}...")
+            canvas = canvases.setdefault(seg["chat"], ChatCanvas()) if scroll_buffer else None
+            PROFILER.current = seg["index"]
+            # Consecutive messages never share a frame, so compiling per message loses no merging
+            timeline.play(compile_segment(seg, canvas))
+            if progress:
+                progress(seg["index"] + 1, len(plan))
+        PROFILER.current = None
+        writer.close()
+        frames, unique, scheduled = writer.frames_written, timeline.unique, timeline.scheduled
+        encode_seconds, duration = writer.encode_seconds, writer.duration
+        output = writer.path
+
+    size = output_bytes(output)
+    kbps = size * 8 / duration / 1000 if duration else 0.0
+    log(f"Rendered {unique} unique frames ({scheduled} scheduled)")
+    log(f"Encode ({backend}, {profile}): {encode_seconds:.2f}s in encoder, {duration:.1f}s of video, "
+        f"{size / 1e6:.2f} MB at {kbps:.0f} kb/s")
+    stats = TEXT_MEASURE.stats()
+    log(f"Text measure cache: {stats['width_hits']} width hits / {stats['width_misses']} misses, "
+        f"{stats['wrap_hits']} wrap hits / {stats['wrap_misses']} misses")
+    return {
+        "output": output,
+        "messages": len(plan),
+        "frames": frames,
+        "unique_frames": unique,
+        "seconds": round(time.perf_counter() - started, 3),
+        "encode_seconds": round(encode_seconds, 3),
+        "duration": round(duration, 3),
+        "bytes": size,
+        "bitrate_kbps": round(kbps, 1),
+    }
+
+def _calibrate_render_cost(plan, indices, output, fps, backend, profile, scroll_buffer):
+    """Render and encode the segments at ``indices`` into a scratch file.
+
+    Returns ``(seconds per unique frame rendered, seconds per frame written,
+    unique frames sampled)``.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='story-dry-run-')
+    try:
+        ext = os.path.splitext(output)[1] or '.mp4'
+        writer = WRITER_BACKENDS[backend](os.path.join(tmpdir, 'sample' + ext), (WIDTH, HEIGHT), fps=fps,
+                                          **ENCODER_PROFILES[profile])
+        renderer = FrameRenderer()
+        canvases = {}
+        render_seconds = 0.0
+        unique = 0
+        for i in indices:
+            seg = plan[i]
+            canvas = canvases.setdefault(seg["chat"], ChatCanvas()) if scroll_buffer else None
+            entries, _ = compile_segment(seg, canvas)
+            for _, spec, duration in entries:
+                started = time.perf_counter()
+                img = renderer.render(spec)
+                render_seconds += time.perf_counter() - started
+                writer.write(img, duration)
+            unique += len(entries)
+        writer.close()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return render_seconds / unique, writer.encode_seconds / max(1, writer.frames_written), unique
+
+def dry_run(story, output, fps=24, workers=1, backend='pipe', profile=DEFAULT_ENCODER_PROFILE, scroll_buffer=False,
+            cache=None, sample=DRY_RUN_SAMPLE_FRAMES, log=print):
+    """Compile a story's timeline and report what ``render_story`` would produce, without rendering it.
+
+    The timeline is the one the renderer plays (``compile_segment`` per
+    planned message), so ``frames``, ``unique_frames``, ``scheduled_frames``
+    and ``duration`` equal what ``render_story`` reports with the same
+    settings. ``events`` groups each message's frames by kind with their
+    start time, duration and unique frame count. ``estimated_seconds``
+    extrapolates from rendering and encoding about ``sample`` unique frames
+    (None when ``sample`` is 0); segments already in ``cache`` cost nothing.
+    """
+    started = time.perf_counter()
+    plan = plan_story(story["dialogue"], story["me"], story["chat_type"], contact=story["contact"],
+                      group_title=story["group_title"], show_names=story["show_names"])
+    workers = max(1, min(workers, len(plan)))
+    if backend == 'png':
+        workers, cache = 1, None
+    # Segmented renders give every message its own writer, so frame rounding restarts per message
+    segmented = cache is not None or workers > 1
+    constant_rate = issubclass(WRITER_BACKENDS[backend], ConstantRateWriter)
+    cached = set()
+    if cache is not None:
+        ext = os.path.splitext(output)[1] or '.mp4'
+        keys = segment_cache_keys(plan, fps, backend, profile, scroll_buffer)
+        cached = {i for i, key in enumerate(keys) if cache.contains(key, ext)}
+
+    events = []
+    clock = 0.0
+    frames = unique = scheduled = 0
+    duration = 0.0
+    todo_unique = todo_frames = 0  # Work left for segments that are not cached
+    counter = FrameCounter(fps)
+    for seg in plan:
+        entries, count = compile_segment(seg)
+        if segmented:
+            counter = FrameCounter(fps)
+        written = counter.frames_written
+        for (kind, title), group in itertools.groupby(entries, key=lambda e: (e[0], e[1].title)):
+            group = list(group)
+            length = sum(e[2] for e in group)
+            events.append({"message": seg["index"] + 1, "sender": seg["name"], "kind": kind, "title": title,
+                           "start": round(clock, 3), "duration": round(length, 3), "unique_frames": len(group)})
+            clock += length
+            for e in group:
+                counter.write(None, e[2])
+        if constant_rate:
+            seg_frames = counter.frames_written - written
+        else:
+            seg_frames = len(entries)  # One encoded image per unique frame
+        seg_duration = sum(e[2] for e in entries)
+        frames += seg_frames
+        duration += seg_duration
+        unique += len(entries)
+        scheduled += count
+        if seg["index"] not in cached:
+            todo_unique += len(entries)
+            todo_frames += seg_frames
+    if constant_rate:
+        duration = frames / fps
+    compile_seconds = time.perf_counter() - started
+
+    estimate = sampled = None
+    todo = [seg["index"] for seg in plan if seg["index"] not in cached]
+    if not todo:
+        estimate, sampled = compile_seconds, 0
+    elif sample:
+        # Whole messages spread over the story, so partial redraws are sampled as they occur
+        count = max(1, min(len(todo), round(sample * len(todo) / max(1, todo_unique))))
+        indices = [todo[int(k * len(todo) / count)] for k in range(count)]
+        per_frame, per_written, sampled = _calibrate_render_cost(plan, indices, output, fps, backend, profile,
+                                                                 scroll_buffer)
+        parallel = min(workers, os.cpu_count() or 1)
+        estimate = compile_seconds + (todo_unique * per_frame + todo_frames * per_written) / parallel
+
+    log(f"{'start':>9} {'length':>7} {'frames':>6}  message")
+    for e in events:
+        detail = f" {e['title']}" if e["kind"] == 'open' else ""
+        log(f"{e['start']:8.2f}s {e['duration']:6.2f}s {e['unique_frames']:>6}  "
+            f"#{e['message']} {e['sender'][:12]}: {e['kind']}{detail}")
+    log(f"{len(plan)} messages: {duration:.1f}s of video, {frames} frames at {fps} fps, "
+        f"{unique} unique ({scheduled} scheduled)")
+    if cache is not None:
+        log(f"Segment cache: {len(cached)}/{len(plan)} segments already rendered")
+    if not todo:
+        log("Estimated render time: only joining cached segments")
+    elif estimate is not None:
+        log(f"Estimated render time: ~{estimate:.1f}s ({backend}, {profile}, {workers} worker(s); "
+            f"calibrated on {sampled} frames)")
+    return {
+        "messages": len(plan),
+        "events": events,
+        "frames": frames,
+        "unique_frames": unique,
+        "scheduled_frames": scheduled,
+        "duration": round(duration, 3),
+        "cached_segments": len(cached),
+        "compile_seconds": round(compile_seconds, 3),
+        "estimated_seconds": None if estimate is None else round(estimate, 3),
+    }
+
+def preview_output(output, mode):
+    """Preview file name next to ``output`` so a preview never overwrites the full render."""
+    stem = os.path.splitext(output)[0]
+    return f"{stem}.preview.png" if mode == 'sheet' else f"{stem}.draft{os.path.splitext(output)[1] or '.mp4'}"
+
+def render_contact_sheet(story, output, columns=PREVIEW_COLUMNS, log=print):
+    """Save one settled frame per message, laid out in a numbered grid, as an image."""
+    plan = plan_story(story["dialogue"], story["me"], story["chat_type"], contact=story["contact"],
+                      group_title=story["group_title"], show_names=story["show_names"])
+    gap, label_h = px(12), px(40)
+    columns = max(1, min(columns, len(plan)))
+    rows = -(-len(plan) // columns)
+    sheet = Image.new("RGB", (gap + columns * (WIDTH + gap), gap + rows * (HEIGHT + label_h + gap)), NAV_BG)
+    draw = ImageDraw.Draw(sheet)
+    for seg in plan:
+        x = gap + (seg["index"] % columns) * (WIDTH + gap)
+        y = gap + (seg["index"] // columns) * (HEIGHT + label_h + gap)
+        frame = FrameSpec(seg["history"][:seg["count"] + 1], title=seg["title"]).render()
+        sheet.paste(frame, (x, y + label_h))
+        draw.text((x, y), f"{seg['index'] + 1}. {seg['name']}", font=SMALL_FONT, fill=TEXT_SUBTLE)
+    sheet.save(output)
+    log(f"Contact sheet: {len(plan)} messages in {rows}x{columns} grid")
+    return {"output": output, "messages": len(plan), "bytes": os.path.getsize(output)}
+
+def warm_caches():
+    """Build the story-independent layers and glyph atlases up front (before forking workers)."""
+    keyboard_layer()
+    key_sprites()
+    home_indicator_layer()
+    # Forked workers share these copy-on-write instead of each rasterizing its own
+    glyph_atlas(FONT).prewarm(ATLAS_PREWARM_CHARS)
+    for font in (SMALL_FONT, TIME_FONT, HEADER_FONT):
+        glyph_atlas(font).prewarm(string.ascii_letters + string.digits, kerning=False)
+
+def is_batch_manifest(path):
+    """Whether a ``.jsonl`` file is a batch manifest rather than a streamed script.
+
+    Manifest lines carry a ``script`` key; a script's header and message
+    lines never do.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                try:
+                    first = json.loads(line)
+                except ValueError:
+                    return False
+                return isinstance(first, dict) and 'script' in first
+    return False
+
+def collect_batch_jobs(source, output_dir):
+    """Expand ``--batch`` into job dicts: a directory, a glob, or a .jsonl manifest.
+
+    Manifest lines hold ``{"script": path_or_inline_script, "output": ...}``
+    plus optional ``me``/``title``/``type``/``contact`` overrides; relative
+    script paths are resolved against the manifest's directory and relative
+    outputs against ``output_dir``, as the daemon does. A ``.jsonl``
+    script (see ``ScriptStream``) is rendered as a single job.
+    """
+    if source.endswith('.jsonl') and os.path.isfile(source) and is_batch_manifest(source):
+        base = os.path.dirname(os.path.abspath(source))
+        jobs = []
+        with open(source, 'r', encoding='utf-8') as f:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                job = json.loads(line)
+                if isinstance(job.get('script'), str):
+                    job['script'] = os.path.join(base, job['script'])
+                    stem = os.path.splitext(os.path.basename(job['script']))[0]
+                else:
+                    stem = f"job-{n:04d}"
+                job['output'] = os.path.join(output_dir, job.get('output') or f"{stem}.mp4")
+                jobs.append(job)
+        return jobs
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, '*.json')))
+    else:
+        paths = sorted(glob.glob(source))
+    return [{"script": path, "output": os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '.mp4')}
+            for path in paths]
+
+def _run_batch_job(job, fps, backend, profile, scroll_buffer, cache=None, progress=None):
+    """Render one batch job and summarize it; errors are reported, not raised."""
+    global BATTERY_LEVEL, CLOCK_TIME
+    BATTERY_LEVEL = random.randint(15, 100)  # Each story gets its own phone state
+    CLOCK_TIME = None
+    script_ref = job['script']
+    summary = {"script": script_ref if isinstance(script_ref, str) else "<inline>", "output": job['output']}
+    try:
+        script = load_script(script_ref) if isinstance(script_ref, str) else parse_script(script_ref)
+        story = checked_story(script, me=job.get('me'), title=job.get('title'),
+                              chat_type=job.get('type'), contact=job.get('contact'))
+        if cache is not None:
+            pin_phone_state(story)
+        summary.update(render_story(story, job['output'], fps=fps, backend=backend, profile=profile,
+                                    scroll_buffer=scroll_buffer, cache=cache,
+                                    log=lambda *a, **k: None, progress=progress))
+        summary["status"] = "ok"
+    except Exception as e:
+        summary.update(status="error", error=f"{type(e).__name__}: {e}")
+    return summary
+
+def _run_batch_job_star(task):
+    return _run_batch_job(*task)
+
+def run_batch(source, output_dir, jobs=1, summary_path=None, fps=24, backend='pipe',
+              profile=DEFAULT_ENCODER_PROFILE, scroll_buffer=False, cache=None):
+    """Render every script in ``source`` with warm fonts, layers and caches shared per process."""
+    batch = collect_batch_jobs(source, output_dir)
+    if not batch:
+        raise ValueError(f"No scripts found for --batch {source}")
+    os.makedirs(output_dir, exist_ok=True)
+    for job in batch:
+        os.makedirs(os.path.dirname(os.path.abspath(job['output'])), exist_ok=True)
+    summary_path = summary_path or os.path.join(output_dir, 'batch_summary.jsonl')
+    jobs = max(1, min(jobs, len(batch)))
+    print(f"Batch: {len(batch)} scripts, {jobs} at a time -> {output_dir}")
+
+    warm_caches()
+    started = time.perf_counter()
+    tasks = [(job, fps, backend, profile, scroll_buffer, cache) for job in batch]
+    ok = 0
+    with open(summary_path, 'w', encoding='utf-8') as out:
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs, initializer=_ensure_layout, initargs=((WIDTH, HEIGHT),))
+            results = pool.imap_unordered(_run_batch_job_star, tasks)
+        else:
+            pool = None
+            results = map(_run_batch_job_star, tasks)
+        try:
+            for done, summary in enumerate(results, 1):
+                out.write(json.dumps(summary, ensure_ascii=False) + '\n')
+                out.flush()
+                if summary["status"] == "ok":
+                    ok += 1
+                    print(f"[{done}/{len(batch)}] {summary['output']}: {summary['frames']} frames, "
+                          f"{summary['seconds']:.1f}s, {summary['bytes'] / 1e6:.2f} MB")
+                else:
+                    print(f"[{done}/{len(batch)}] {summary['script']}: {summary['error']}")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    elapsed = time.perf_counter() - started
+    print(f"✅ Batch done: {ok}/{len(batch)} stories in {elapsed:.1f}s "
+          f"({ok * 3600 / elapsed if elapsed else 0:.0f} stories/hour); summary -> {summary_path}")
+
+DAEMON_PORT = 8765
+DAEMON_KEEP_FINISHED = 1000  # Finished jobs whose status stays queryable
+
+# Progress queue of a daemon worker process (set by _init_daemon_worker)
+_DAEMON_PROGRESS = None
+
+def _init_daemon_worker(size, progress):
+    global _DAEMON_PROGRESS
+    _ensure_layout(size)
+    warm_caches()
+    _DAEMON_PROGRESS = progress
+
+def _run_daemon_job(job_id, job, settings):
+    """Render one daemon job in a warm worker, reporting progress to the daemon."""
+    report = lambda done, total: _DAEMON_PROGRESS.put((job_id, done, total))
+    return job_id, _run_batch_job(job, *settings, progress=report)
+
+class RenderDaemon:
+    """Priority job queue feeding a pool of warm render processes.
+
+    Workers are forked once with fonts, layout and chrome layers already
+    built, so a job costs only its own render. Higher ``priority`` runs
+    first; equal priorities run in submission order.
+    """
+
+    def __init__(self, output_dir, workers=1, fps=24, backend='pipe', profile=DEFAULT_ENCODER_PROFILE,
+                 scroll_buffer=False, cache=None):
+        self.output_dir = os.path.abspath(output_dir)
+        self.workers = max(1, workers)
+        self.fps = fps
+        self.backend = backend
+        self.profile = profile
+        self.scroll_buffer = scroll_buffer
+        self.cache = cache
+        self.jobs = OrderedDict()  # id -> job state, in submission order
+        self._queue = []  # Heap of (-priority, seq, id)
+        self._seq = 0
+        self._lock = threading.Condition()
+        self._free = threading.Semaphore(self.workers)
+        self._progress = None
+        self._pool = None
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        warm_caches()
+        self._progress = multiprocessing.Queue()
+        self._pool = multiprocessing.Pool(self.workers, initializer=_init_daemon_worker,
+                                          initargs=((WIDTH, HEIGHT), self._progress))
+        threading.Thread(target=self._dispatch, daemon=True).start()
+        threading.Thread(target=self._watch_progress, daemon=True).start()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+
+    def submit(self, request):
+        """Queue a job from a request body; returns its status. Raises ValueError for a bad request."""
+        if not isinstance(request, dict):
+            raise ValueError('Request body must be a JSON object')
+        script = request.get('script')
+        if not isinstance(script, (dict, list)):
+            raise ValueError('"script" must be a script object or message list (load_script format)')
+        for key in ('me', 'title', 'type', 'contact', 'output'):
+            if request.get(key) is not None and not isinstance(request[key], str):
+                raise ValueError(f'"{key}" must be a string')
+        # Reject scripts that would fail in a worker (malformed, empty, roles not inferable)
+        checked_story(parse_script(script), me=request.get('me'), title=request.get('title'),
+                      chat_type=request.get('type'), contact=request.get('contact'))
+        priority = request.get('priority', 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError('"priority" must be an integer')
+        job_id = uuid.uuid4().hex[:12]
+        output = os.path.abspath(os.path.join(self.output_dir, request.get('output') or f"{job_id}.mp4"))
+        if os.path.commonpath([output, self.output_dir]) != self.output_dir:
+            raise ValueError('"output" must stay inside the daemon\'s output directory')
+        try:
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        except OSError as e:
+            raise ValueError(f'cannot create the output directory: {e}')
+        job = {"script": script, "output": output}
+        job.update((key, request[key]) for key in ('me', 'title', 'type', 'contact') if request.get(key))
+        with self._lock:
+            self.jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "priority": priority,
+                "output": output,
+                "submitted": time.time(),
+                "progress": {"done": 0, "total": len(script.get('messages', ()) if isinstance(script, dict) else script)},
+                "job": job,
+            }
+            heapq.heappush(self._queue, (-priority, self._seq, job_id))
+            self._seq += 1
+            self._lock.notify()
+            return self._public(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued job; returns its status, or None for an unknown id."""
+        with self._lock:
+            state = self.jobs.get(job_id)
+            if state is not None and state["status"] == "queued":
+                state.update(status="cancelled", finished=time.time())
+            return self._public(job_id) if state is not None else None
+
+    def job(self, job_id):
+        with self._lock:
+            return self._public(job_id) if job_id in self.jobs else None
+
+    def status(self):
+        with self._lock:
+            counts = {}
+            for state in self.jobs.values():
+                counts[state["status"]] = counts.get(state["status"], 0) + 1
+            return {
+                "workers": self.workers,
+                "queue_depth": counts.get("queued", 0),
+                "running": [self._public(i) for i, state in self.jobs.items() if state["status"] == "running"],
+                "jobs": counts,
+            }
+
+    def list_jobs(self):
+        with self._lock:
+            positions = self._queue_positions()
+            return [self._public(job_id, positions) for job_id in self.jobs]
+
+    def _queue_positions(self):
+        """``{job_id: position}`` for every queued job, from one pass over the heap; caller holds the lock."""
+        queued = sorted(entry for entry in self._queue
+                        if entry[2] in self.jobs and self.jobs[entry[2]]["status"] == "queued")
+        return {entry[2]: position for position, entry in enumerate(queued, 1)}
+
+    def _public(self, job_id, positions=None):
+        """A job's state without its script; caller holds the lock."""
+        state = self.jobs[job_id]
+        public = {key: value for key, value in state.items() if key != "job"}
+        if state["status"] == "queued":
+            public["queue_position"] = (positions or self._queue_positions())[job_id]
+        return public
+
+    def _dispatch(self):
+        settings = (self.fps, self.backend, self.profile, self.scroll_buffer, self.cache)
+        while True:
+            self._free.acquire()
+            with self._lock:
+                while True:
+                    while not self._queue:
+                        self._lock.wait()
+                    _, _, job_id = heapq.heappop(self._queue)
+                    if job_id in self.jobs and self.jobs[job_id]["status"] == "queued":  # Skip cancelled jobs
+                        break
+                state = self.jobs[job_id]
+                state.update(status="running", started=time.time())
+                job = state.pop("job")
+            print(f"▶ {job_id} (priority {state['priority']}) -> {state['output']}")
+            self._pool.apply_async(_run_daemon_job, (job_id, job, settings),
+                                   callback=self._finished, error_callback=self._failed(job_id))
+
+    def _finished(self, result):
+        job_id, summary = result
+        with self._lock:
+            state = self.jobs[job_id]
+            state.update(status="done" if summary["status"] == "ok" else "error", finished=time.time(), result=summary)
+            if summary["status"] == "ok":
+                state["progress"]["done"] = state["progress"]["total"] = summary["messages"]
+            self._prune()
+        self._free.release()
+        if summary["status"] == "ok":
+            print(f"✅ {job_id}: {summary['frames']} frames in {summary['seconds']:.1f}s -> {summary['output']}")
+        else:
+            print(f"❌ {job_id}: {summary['error']}")
+
+    def _failed(self, job_id):
+        def failed(error):
+            self._finished((job_id, {"status": "error", "error": f"{type(error).__name__}: {error}"}))
+        return failed
+
+    def _prune(self):
+        finished = [i for i, state in self.jobs.items() if state["status"] in ("done", "error", "cancelled")]
+        for job_id in finished[:max(0, len(finished) - DAEMON_KEEP_FINISHED)]:
+            del self.jobs[job_id]
+
+    def _watch_progress(self):
+        while True:
+            job_id, done, total = self._progress.get()
+            with self._lock:
+                state = self.jobs.get(job_id)
+                if state is not None and state["status"] == "running":
+                    state["progress"] = {"done": done, "total": total}
+
+class _DaemonAPI:
+    """JSON API: POST /jobs, GET /jobs, GET /jobs/<id>, DELETE /jobs/<id>, GET /status.
+
+    Mixed into ``BaseHTTPRequestHandler`` by ``serve`` so http.server is only
+    imported when the daemon runs.
+    """
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_id(self):
+        parts = self.path.rstrip('/').split('/')
+        return parts[2] if len(parts) == 3 and parts[1] == 'jobs' else None
+
+    def do_GET(self):
+        daemon = self.server.render_daemon
+        path = self.path.rstrip('/')
+        if path == '/status':
+            return self._reply(200, daemon.status())
+        if path == '/jobs':
+            return self._reply(200, daemon.list_jobs())
+        state = daemon.job(self._job_id()) if self._job_id() else None
+        if state is None:
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, state)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self._reply(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            state = self.server.render_daemon.submit(json.loads(self.rfile.read(length) or b'null'))
+        except ValueError as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(202, state)
+
+    def do_DELETE(self):
+        state = self.server.render_daemon.cancel(self._job_id()) if self._job_id() else None
+        if state is None:
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, state)
+
+    def log_message(self, format, *args):
+        pass  # The daemon prints job events itself
+
+def serve(daemon, host='127.0.0.1', port=DAEMON_PORT):
+    """Run ``daemon`` behind a local HTTP API until interrupted."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    handler = type('DaemonHandler', (_DaemonAPI, BaseHTTPRequestHandler), {})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.render_daemon = daemon
+    daemon.start()
+    print(f"Render daemon on http://{host}:{server.server_port} with {daemon.workers} warm workers "
+          f"-> {daemon.output_dir}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        server.server_close()
+        daemon.close()
+
+def main():
+    args = parse_args()
+
+    def load_story():
+        # Every path loads the script the way --validate checks it
+        try:
+            return validate_script(args.script, me=args.me, title=args.title, chat_type=args.type,
+                                   contact=args.contact)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"❌ Invalid script {args.script}: {e}")
+
+    if args.validate:
+        story = load_story()
+        if story["chat_type"] == 'direct':
+            chat = f"direct chat with {story['contact']}"
+        else:
+            chat = f"group chat \"{story['group_title']}\" ({len(story['participants'])} participants)"
+        print(f"✅ {args.script}: {len(story['dialogue'])} messages, {chat}, me: {story['me']}")
+        return
+    try:
+        layout = Layout.parse(args.resolution)
+    except ValueError as e:
+        raise SystemExit(f"--resolution: {e}")
+    if args.preview:
+        layout = layout.scaled(args.preview_scale)
+    if (layout.width, layout.height) != (WIDTH, HEIGHT):
+        configure_layout(layout)
+    else:
+        load_fonts()
+    backend = 'vfr' if args.vfr else args.encoder
+    pix_fmt = ENCODER_PROFILES[args.encoder_profile].get('pix_fmt', 'yuv420p')
+    if backend == 'moviepy' and pix_fmt != 'yuv420p':
+        raise SystemExit(f"--encoder-profile {args.encoder_profile} writes {pix_fmt}, which the moviepy encoder "
+                         f"cannot produce; use --encoder pipe")
+    cache = SegmentCache(args.cache_dir, int(args.cache_size * 1024 * 1024)) if args.cache else None
+    if args.dry_run:
+        story = load_story()
+        if cache is not None:
+            pin_phone_state(story)
+        dry_run(story, args.output, fps=args.fps, workers=args.workers, backend=backend, profile=args.encoder_profile,
+                scroll_buffer=args.scroll_buffer, cache=cache)
+        return
+    if args.serve is not None:
+        serve(RenderDaemon(args.output_dir, workers=args.jobs, fps=args.fps, backend=backend,
+                           profile=args.encoder_profile, scroll_buffer=args.scroll_buffer, cache=cache),
+              host=args.host, port=args.serve)
+        return
+    if args.batch:
+        run_batch(args.batch, args.output_dir, jobs=args.jobs, summary_path=args.summary,
+                  fps=args.fps, backend=backend, profile=args.encoder_profile, scroll_buffer=args.scroll_buffer,
+                  cache=cache)
+        return
+
+    started = time.perf_counter()
+    PROFILER.enabled = args.profile is not None
+    print("Loading script and initializing...")
+    print(f"Loading script from: {args.script}")
+    with PROFILER.stage('load'):
+        story = load_story()
+    print(f"Loaded {len(story['dialogue'])} messages")
+    if args.preview:
+        started = time.perf_counter()
+        output = preview_output(args.output, args.preview)
+        print(f"Preview ({args.preview}) at {WIDTH}x{HEIGHT}")
+        if args.preview == 'sheet':
+            render_contact_sheet(story, output)
+        else:
+            render_story(story, output, fps=PREVIEW_FPS, workers=args.workers, scroll_buffer=args.scroll_buffer)
+        print(f"✅ Preview generated in {time.perf_counter() - started:.1f}s -> {output}")
+        return
+    if cache is not None:
+        pin_phone_state(story)
+    summary = render_story(story, args.output, fps=args.fps, workers=args.workers, backend=backend,
+                           profile=args.encoder_profile, scroll_buffer=args.scroll_buffer, cache=cache)
+    if PROFILER.enabled:
+        wall = time.perf_counter() - started
+        PROFILER.print_report(wall)
+        profile_path = args.profile or os.path.splitext(args.output)[0] + '.profile.json'
+        with open(profile_path, 'w', encoding='utf-8') as f:
+            json.dump({"wall_seconds": round(wall, 4), "render": summary, **PROFILER.report()}, f, indent=2)
+        print(f"Profile saved -> {profile_path}")
+    print(f"✅ Video generated successfully -> {summary['output']} ({summary['frames']} frames)")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
+else:
+    load_fonts()  # Importers and spawned workers get a ready renderer